@@ -0,0 +1,103 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import duckdb
+
+# -----------------------------
+# Data backends
+# -----------------------------
+# Every backend exposes the same tables (yellow_taxi_2019_1, chicago_taxi_2023,
+# cta_l_ridership, ...) under `<alias>.main`, so queries only ever see the
+# alias. MotherDuck is the hosted default; a local .duckdb file or a directory
+# of Parquet files give a zero-network mirror for offline runs and benchmarks.
+
+DEFAULT_ALIAS = "taxi_db"
+
+
+@dataclass(frozen=True)
+class MotherDuckBackend:
+    token: str
+    database: str = "taxi_assign"
+    alias: str = DEFAULT_ALIAS
+    kind: str = "motherduck"
+
+    def connect(self) -> duckdb.DuckDBPyConnection:
+        conn = duckdb.connect()
+        conn.execute("INSTALL motherduck;")
+        conn.execute("LOAD motherduck;")
+        conn.execute(f"SET motherduck_token='{self.token}';")
+        conn.execute(f"ATTACH 'md:{self.database}' AS {self.alias};")
+        return conn
+
+
+@dataclass(frozen=True)
+class DuckDBFileBackend:
+    path: str
+    read_only: bool = False
+    alias: str = DEFAULT_ALIAS
+    kind: str = "duckdb"
+
+    def connect(self) -> duckdb.DuckDBPyConnection:
+        if not Path(self.path).exists():
+            raise FileNotFoundError(f"DuckDB file not found: {self.path}")
+        conn = duckdb.connect()
+        mode = " (READ_ONLY)" if self.read_only else ""
+        conn.execute(f"ATTACH '{self.path}' AS {self.alias}{mode};")
+        return conn
+
+
+@dataclass(frozen=True)
+class ParquetBackend:
+    """One view per table over `<directory>/<table>.parquet` and/or a partitioned `<directory>/<table>/`.
+
+    When both exist (a base file plus monthly appends from ingest.py) the view
+    is their union.
+    """
+    directory: str
+    alias: str = DEFAULT_ALIAS
+    kind: str = "parquet"
+
+    def tables(self) -> dict[str, list[str]]:
+        root = Path(self.directory)
+        if not root.is_dir():
+            raise FileNotFoundError(f"Parquet directory not found: {self.directory}")
+        found: dict[str, list[str]] = {}
+        for entry in sorted(root.iterdir()):
+            if entry.is_file() and entry.suffix == ".parquet":
+                found.setdefault(entry.stem, []).append(str(entry))
+            elif entry.is_dir() and any(entry.rglob("*.parquet")):
+                found.setdefault(entry.name, []).append(str(entry / "**" / "*.parquet"))
+        return found
+
+    def connect(self) -> duckdb.DuckDBPyConnection:
+        conn = duckdb.connect()
+        conn.execute(f"ATTACH ':memory:' AS {self.alias};")
+        for table, patterns in self.tables().items():
+            # A flat file and a hive directory can't share one read_parquet call.
+            scans = "\n            UNION ALL BY NAME\n            ".join(
+                f"SELECT * FROM read_parquet('{p}', hive_partitioning = true, union_by_name = true)"
+                for p in patterns
+            )
+            conn.execute(f"""
+            CREATE VIEW {self.alias}.main.{table} AS
+            {scans};
+            """)
+        return conn
+
+
+Backend = MotherDuckBackend | DuckDBFileBackend | ParquetBackend
+
+
+def backend_from_env(md_token: str = "", env: dict | None = None) -> Backend:
+    """COMMUTEPULSE_BACKEND=motherduck|duckdb|parquet, COMMUTEPULSE_DATA=<file or directory>."""
+    env = os.environ if env is None else env
+    kind = env.get("COMMUTEPULSE_BACKEND", "motherduck").lower()
+    data = env.get("COMMUTEPULSE_DATA", "")
+    if kind == "motherduck":
+        return MotherDuckBackend(token=md_token, database=env.get("COMMUTEPULSE_MD_DATABASE", "taxi_assign"))
+    if kind == "duckdb":
+        return DuckDBFileBackend(path=data or "taxi.duckdb", read_only=env.get("COMMUTEPULSE_READ_ONLY") == "1")
+    if kind == "parquet":
+        return ParquetBackend(directory=data or "data")
+    raise ValueError(f"unknown COMMUTEPULSE_BACKEND {kind!r} (expected motherduck, duckdb or parquet)")
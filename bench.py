@@ -0,0 +1,204 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+
+from backends import DuckDBFileBackend
+from dispatch import PreparedStatements, encode_categoricals
+from fusion import fused_sql, split
+from profiling import profile_metrics
+from queries import FUSED, QUERIES, QueryContext, bind, bind_params, discover_partitions
+from query_cache import table_versions
+from rollups import (
+    CUBES,
+    STATE_TABLE,
+    TRAFFIC_ROLLUP,
+    ZONE_COUNTS,
+    load_code_dims,
+    load_zone_dim,
+    refresh_rollups,
+)
+from synthetic import generate, parse_scale
+
+# -----------------------------
+# Query benchmark
+# -----------------------------
+# Runs every registered dashboard query (and each fused chart group) against a
+# local synthetic DuckDB and records latency percentiles plus DuckDB's own
+# rows-scanned and peak-buffer-memory counters. Results are written as JSON so
+# two commits can be compared with --compare.
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def time_runs(conn, run, warmup: int, repeat: int) -> dict:
+    """Call run() warmup + repeat times; run returns the number of result rows."""
+    for _ in range(warmup):
+        run()
+    samples, rows, counters = [], 0, []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = run()
+        samples.append((time.perf_counter() - start) * 1000)
+        counters.append(profile_metrics(json.loads(conn.get_profiling_information(format="json"))))
+    return {
+        "runs": repeat,
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "mean_ms": statistics.fmean(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "rows_returned": rows,
+        "rows_scanned": counters[-1]["rows_scanned"],
+        "peak_buffer_bytes": counters[-1]["peak_buffer_bytes"],
+    }
+
+
+def build_rollups(conn, db: str) -> float:
+    for table in table_versions(conn, db):
+        if table.startswith((*(cube.table for cube in CUBES.values()), ZONE_COUNTS, TRAFFIC_ROLLUP)):
+            conn.execute(f"DROP TABLE {db}.main.{table};")
+    conn.execute(f"DROP TABLE IF EXISTS {db}.main.{STATE_TABLE};")
+    start = time.perf_counter()
+    refresh_rollups(conn, db, db)
+    return time.perf_counter() - start
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmark(db_path: str, warmup: int, repeat: int, only: list[str] | None = None) -> dict:
+    backend = DuckDBFileBackend(path=db_path)
+    conn = backend.connect()
+    rollup_seconds = build_rollups(conn, backend.alias)
+    partitions = discover_partitions(table_versions(conn, backend.alias))
+    conn.close()
+
+    # DuckDB's peak buffer memory is per database instance and never resets,
+    # so each query gets its own instance for its peak to be its own.
+    reader = DuckDBFileBackend(path=db_path, read_only=True)
+    ctx = QueryContext(source_db=reader.alias, rollup_db=reader.alias, partitions=partitions)
+    # Same result path as the app: prepared statements with bound parameters,
+    # Arrow with dictionary-encoded strings. Warm-up runs do the PREPARE.
+    jobs = {
+        name: lambda conn, statements, bound=bind(name, ctx):
+            encode_categoricals(statements.execute(conn, *bound).to_arrow_table()).num_rows
+        for name in QUERIES
+    }
+    for groups in FUSED.values():
+        for group in groups:
+            relation, aggregates = group(ctx)
+
+            def run(conn, statements, sql=fused_sql(relation, aggregates), aggregates=aggregates):
+                parts = split(statements.execute(conn, sql, bind_params(sql, ctx)).to_arrow_table(), aggregates)
+                return sum(encode_categoricals(p).num_rows for p in parts.values())
+
+            jobs[f"{group.__name__} (fused)"] = run
+
+    results = {}
+    for name, job in jobs.items():
+        if only and name not in only:
+            continue
+        conn = reader.connect()
+        load_zone_dim(conn, reader.alias)
+        load_code_dims(conn)
+        conn.execute("PRAGMA enable_profiling = 'no_output';")
+        statements = PreparedStatements()
+        results[name] = time_runs(conn, lambda: job(conn, statements), warmup, repeat)
+        conn.close()
+    return {"rollup_build_s": rollup_seconds, "queries": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Queries whose p50 grew by more than `threshold` (a ratio) against the baseline."""
+    regressions = []
+    for name, stats in current["queries"].items():
+        base = baseline.get("queries", {}).get(name)
+        if not base or base["p50_ms"] <= 0:
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"]
+        if ratio > threshold:
+            regressions.append(f"{name}: p50 {base['p50_ms']:.1f} -> {stats['p50_ms']:.1f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark every CommutePulse dashboard query")
+    parser.add_argument("--scale", default="1M", help="rows per trip/traffic table: 1M, 10M, 100M or a number")
+    parser.add_argument("--db", default=None, help="synthetic DuckDB path (default bench_<scale>.duckdb)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the synthetic data even if --db exists")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--query", action="append", help="only run this query (repeatable)")
+    parser.add_argument("--out", default=None, help="write JSON results here (default stdout)")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    rows = parse_scale(args.scale)
+    db_path = args.db or f"bench_{args.scale}.duckdb"
+    generate_seconds = None
+    if args.regenerate or not Path(db_path).exists():
+        Path(db_path).unlink(missing_ok=True)
+        generate_seconds = sum(generate(db_path, rows).values())
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "rows_per_table": rows,
+            "duckdb": duckdb.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+        },
+        "generate_s": generate_seconds,
+        **run_benchmark(db_path, args.warmup, args.repeat, args.query),
+    }
+
+    for name, stats in report["queries"].items():
+        print(
+            f"{name:<28} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  "
+            f"scanned {stats['rows_scanned']:>12,}  peak {stats['peak_buffer_bytes'] / 2**20:8.1f} MiB",
+            file=sys.stderr,
+        )
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(payload + "\n")
+    else:
+        print(payload)
+
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import altair as alt
+import pyarrow as pa
+
+# -----------------------------
+# Chart spec cache
+# -----------------------------
+# Building an Altair chart (and validating it in to_dict) costs more than the
+# query behind it once results are cached, and the dashboard rebuilds every
+# chart on every rerun. Specs are built once per (chart id, data fingerprint,
+# variant) and kept as serialized Vega-Lite JSON with the data alongside as
+# Arrow IPC named datasets, which is what Streamlit sends to the browser. A
+# rerun over unchanged results only re-hashes the data and loads the JSON.
+
+THEME = "commutepulse"
+TEXT_COLOR = "#e6eef9"
+
+
+@alt.theme.register(THEME, enable=False)
+def commutepulse_theme() -> alt.theme.ThemeConfig:
+    # Light labels on the dark page; per-chart configure_* calls merge over this.
+    return {
+        "config": {
+            "axis": {"labelColor": TEXT_COLOR, "titleColor": TEXT_COLOR},
+            "legend": {"labelColor": TEXT_COLOR, "titleColor": TEXT_COLOR},
+            "header": {"labelColor": TEXT_COLOR},
+        }
+    }
+
+
+def arrow_bytes(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def fingerprint(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _to_named_dataset(data: pa.Table, datasets: dict[str, bytes]) -> dict[str, str]:
+    # Altair data transformer: chart data becomes a named Arrow dataset.
+    payload = arrow_bytes(data)
+    name = fingerprint(payload)
+    datasets[name] = payload
+    return {"name": name}
+
+
+alt.data_transformers.register("commutepulse_arrow", _to_named_dataset)
+
+# Altair's active theme and data transformer are process-wide.
+_altair_lock = threading.Lock()
+
+
+def build_spec(chart: alt.TopLevelMixin) -> tuple[str, dict[str, bytes]]:
+    """Serialize a chart under the shared theme: (spec JSON, Arrow datasets by name)."""
+    datasets: dict[str, bytes] = {}
+    with _altair_lock, alt.theme.enable(THEME), \
+            alt.data_transformers.enable("commutepulse_arrow", datasets=datasets):
+        spec = chart.to_dict()
+    spec.pop("datasets", None)
+    return json.dumps(spec), datasets
+
+
+class ChartSpecs:
+    """LRU of built chart specs, bounded by serialized size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[str, dict[str, bytes], int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def spec(self, name: str, data: pa.Table, build: Callable[[pa.Table], alt.TopLevelMixin],
+             *variant) -> tuple[dict, int, bool]:
+        """Vega-Lite spec for `build(data)`, its size in bytes and whether it was cached.
+
+        `variant` holds anything besides the data that the chart depends on
+        (titles, colours); the returned dict is the caller's to mutate.
+        """
+        key = (name, fingerprint(arrow_bytes(data)), *variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        hit = entry is not None
+        if not hit:
+            spec_json, datasets = build_spec(build(data))
+            entry = (spec_json, datasets, len(spec_json) + sum(map(len, datasets.values())))
+            with self._lock:
+                self.misses += 1
+                self._insert(key, entry)
+        spec_json, datasets, nbytes = entry
+        spec = json.loads(spec_json)
+        spec["datasets"] = dict(datasets)
+        return spec, nbytes, hit
+
+    def _insert(self, key: tuple, entry: tuple[str, dict[str, bytes], int]) -> None:
+        # Caller holds the lock.
+        if entry[2] > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = entry
+        self._bytes += entry[2]
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[2]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
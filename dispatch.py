@@ -0,0 +1,238 @@
+import json
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, TypeVar
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from profiling import Profiler, Record, profile_metrics, result_size
+
+# -----------------------------
+# Prepared statements
+# -----------------------------
+# DuckDB's Python client parses and plans SQL on every execute(). Each pooled
+# cursor instead PREPAREs a statement the first time it sees its SQL text and
+# EXECUTEs that plan with the bound values from then on. EXECUTE only accepts
+# literal arguments, so the values are rendered with sql_value().
+
+MAX_PREPARED = 256  # statements kept per cursor
+
+
+def sql_value(value) -> str:
+    """SQL literal for a bound parameter value."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else f"'{value}'::DOUBLE"
+    if isinstance(value, str):
+        # Imported here: queries imports query_cache, which imports this module.
+        from queries import sql_literal
+        return sql_literal(value)
+    if isinstance(value, datetime):
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, date):
+        return f"DATE '{value.isoformat()}'"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(sql_value(v) for v in value) + "]"
+    raise TypeError(f"can't bind {type(value).__name__} value {value!r}")
+
+
+class PreparedStatements:
+    """Statements prepared on one cursor, keyed by SQL text; least recently used deallocated past capacity."""
+
+    def __init__(self, capacity: int = MAX_PREPARED):
+        self.capacity = capacity
+        self.prepared = 0
+        self.executed = 0
+        self._names: OrderedDict[str, str] = OrderedDict()
+
+    def execute(self, cur: duckdb.DuckDBPyConnection, sql: str, params: dict | list | None = None):
+        name = self._names.get(sql)
+        if name is None:
+            name = f"commutepulse_q{self.prepared}"
+            cur.execute(f"PREPARE {name} AS {sql.strip().rstrip(';')}")
+            self.prepared += 1
+            self._names[sql] = name
+            if len(self._names) > self.capacity:
+                _, evicted = self._names.popitem(last=False)
+                cur.execute(f"DEALLOCATE {evicted}")
+        else:
+            self._names.move_to_end(sql)
+        if isinstance(params, dict):
+            args = ", ".join(f"{key} := {sql_value(value)}" for key, value in params.items())
+        else:
+            args = ", ".join(sql_value(value) for value in params or ())
+        self.executed += 1
+        return cur.execute(f"EXECUTE {name}({args})" if args else f"EXECUTE {name}")
+
+
+# -----------------------------
+# Concurrent query dispatch
+# -----------------------------
+# A fixed set of cursors on the shared DuckDB connection, handed out to a
+# thread pool of the same size. Independent queries are submitted together
+# and gathered as futures, so a page waits for its slowest query rather than
+# the sum of all of them.
+
+T = TypeVar("T")
+
+
+class QueryTimeout(TimeoutError):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of cursors (duplicate connections) on one DuckDB database."""
+
+    def __init__(self, conn: duckdb.DuckDBPyConnection, size: int):
+        self.size = size
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(size):
+            self._idle.put(conn.cursor())
+
+    @contextmanager
+    def cursor(self):
+        cur = self._idle.get()
+        try:
+            yield cur
+        finally:
+            self._idle.put(cur)
+
+
+class QueryExecutor:
+    def __init__(self, conn: duckdb.DuckDBPyConnection, max_workers: int, timeout: float | None,
+                 profiler: Profiler | None = None):
+        self.pool = ConnectionPool(conn, max_workers)
+        self.timeout = timeout
+        self.profiler = profiler
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="commutepulse-query")
+        # Pool cursors live as long as the executor; each is used by one thread at a time.
+        self._statements: dict[int, PreparedStatements] = {}
+
+    def execute(self, cur: duckdb.DuckDBPyConnection, sql: str, params: dict | list | None = None):
+        """Run sql with params on a pooled cursor through its prepared statements."""
+        return self._statements.setdefault(id(cur), PreparedStatements()).execute(cur, sql, params)
+
+    def statement_stats(self) -> dict:
+        statements = list(self._statements.values())
+        prepared = sum(s.prepared for s in statements)
+        executed = sum(s.executed for s in statements)
+        return {
+            "prepared": prepared,
+            "executed": executed,
+            "plan_reuse": round(1 - prepared / executed, 3) if executed else None,
+        }
+
+    def submit(self, fn: Callable[[duckdb.DuckDBPyConnection], T], timeout: float | None = None,
+               label: str = "query", trace: str | None = None) -> Future:
+        """Run fn(cursor) on a pooled cursor; interrupt it if it outlives `timeout` seconds.
+
+        With a `trace` id (and a profiler), the run is profiled and recorded under it.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if trace is not None and self.profiler is not None:
+            return self._threads.submit(self._run_profiled, fn, timeout, label, trace, time.perf_counter())
+        return self._threads.submit(self._run, fn, timeout, label)
+
+    def submit_arrow(self, sql: str, params: dict | list | None = None, timeout: float | None = None,
+                     label: str = "query", trace: str | None = None) -> Future:
+        def fetch(cur):
+            return encode_categoricals(self.execute(cur, sql, params).to_arrow_table())
+        return self.submit(fetch, timeout, label, trace)
+
+    def _run_profiled(self, fn, timeout, label, trace, submitted):
+        started = time.perf_counter()
+        record = Record(kind="query", name=label, trace=trace, wall_ms=0.0,
+                        queued_ms=(started - submitted) * 1000)
+
+        def profiled(cur):
+            cur.execute("PRAGMA enable_profiling = 'no_output';")
+            try:
+                result = fn(cur)
+                record.rows, record.result_bytes = result_size(result)
+                for key, value in profile_metrics(json.loads(cur.get_profiling_information(format="json"))).items():
+                    setattr(record, key, value)
+                record.plan = cur.get_profiling_information(format="query_tree")
+                return result
+            finally:
+                cur.execute("PRAGMA disable_profiling;")
+
+        try:
+            return self._run(profiled, timeout, label)
+        except Exception as exc:
+            record.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            record.wall_ms = (time.perf_counter() - started) * 1000
+            self.profiler.add(record)
+
+    def _run(self, fn, timeout, label):
+        with self.pool.cursor() as cur:
+            if not timeout:
+                return fn(cur)
+            timed_out = threading.Event()
+
+            def interrupt():
+                timed_out.set()
+                cur.interrupt()
+
+            timer = threading.Timer(timeout, interrupt)
+            timer.daemon = True
+            timer.start()
+            try:
+                return fn(cur)
+            except duckdb.InterruptException as exc:
+                if timed_out.is_set():
+                    raise QueryTimeout(f"{label} exceeded {timeout:g}s") from exc
+                raise
+            finally:
+                timer.cancel()
+
+
+def encode_categoricals(table: pa.Table) -> pa.Table:
+    """Dictionary-encode string columns (zone names, stations, payment labels).
+
+    Charts get categoricals without an object-dtype pandas detour, and
+    repeated labels are stored once per column instead of once per row.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(i, field.name, pc.dictionary_encode(table.column(i)))
+    return table
+
+
+def gather(futures: dict[str, Future]) -> dict[str, object]:
+    """Wait for every future; results keyed like the input."""
+    return {name: fut.result() for name, fut in futures.items()}
+
+
+def completed(value: T) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+def then(fut: Future, fn: Callable[[T], object]) -> Future:
+    """Future of fn(fut.result()), resolved from fut's completion callback."""
+    out: Future = Future()
+
+    def resolve(done: Future) -> None:
+        try:
+            out.set_result(fn(done.result()))
+        except Exception as exc:
+            out.set_exception(exc)
+
+    fut.add_done_callback(resolve)
+    return out
@@ -0,0 +1,65 @@
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# -----------------------------
+# Time-series downsampling
+# -----------------------------
+# Long daily series are reduced in two steps: the query buckets dates to the
+# finest day/week/month grain that fits the chart's point budget, and if a
+# series is still over budget (decades of history) LTTB keeps the points that
+# preserve its visual shape. Either way a chart gets at most `max_points` per
+# series, however long the source history grows.
+
+GRAINS = (("day", 1), ("week", 7), ("month", 30.44))
+
+
+def choose_grain(start: date | None, end: date | None, max_points: int) -> str:
+    """Finest grain whose bucket count over [start, end] fits in max_points."""
+    if start is None or end is None:
+        return "day"
+    days = (end - start).days + 1
+    for grain, bucket_days in GRAINS:
+        if days / bucket_days <= max_points:
+            return grain
+    return GRAINS[-1][0]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex.
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def downsample_series(table: pa.Table, x: str, y: str, by: str, max_points: int) -> pa.Table:
+    """Apply LTTB to each `by` group of a table sorted by (by, x) that has more than max_points rows."""
+    if table.num_rows <= max_points:
+        return table
+    keys = table.column(by)
+    parts = []
+    for key in pc.unique(keys).to_pylist():
+        part = table.filter(pc.equal(keys, key))
+        if part.num_rows > max_points:
+            xs = part.column(x).cast(pa.int32() if pa.types.is_date32(part.schema.field(x).type) else pa.float64())
+            idx = lttb_indices(xs.to_numpy(), part.column(y).to_numpy(zero_copy_only=False), max_points)
+            part = part.take(pa.array(idx))
+        parts.append(part)
+    return pa.concat_tables(parts)
@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# -----------------------------
+# Single-scan query fusion
+# -----------------------------
+# Charts on a page that aggregate the same relation are described as
+# Aggregate specs. fused_sql() computes all of them in one GROUPING SETS pass
+# and split() cuts the result back into one table per chart, so the relation
+# is scanned once per page instead of once per chart.
+
+
+@dataclass(frozen=True)
+class Label:
+    """Swap a grouped integer code for its label from a (code, label) table."""
+    table: str
+    other: str | None = None  # SQL literal labelling codes the table doesn't have
+
+    def join(self, source: str, column: str, alias: str) -> tuple[str, str]:
+        """(LEFT JOIN clause, label expression) for `source`.`column`."""
+        label = f"{alias}.label"
+        if self.other is not None:
+            label = f"COALESCE({label}, {self.other})"
+        return f"LEFT JOIN {self.table} {alias} ON {alias}.code = {source}.{column}", label
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    name: str
+    keys: dict[str, str]        # output column -> grouping expression
+    measures: dict[str, str]    # output column -> aggregate expression
+    where: str | None = None    # row filter; groups with no matching rows are dropped
+    order_by: tuple[str, ...] = field(default_factory=tuple)
+    labels: dict[str, Label] = field(default_factory=dict)  # key column -> its label, joined after grouping
+
+    def sql(self, relation: str) -> str:
+        """Standalone equivalent of this aggregate's share of the fused query."""
+        cols = [f"{expr} AS {alias}" for alias, expr in self.keys.items()]
+        cols += [f"{expr} AS {alias}" for alias, expr in self.measures.items()]
+        sql = f"SELECT {', '.join(cols)}\nFROM {relation}"
+        if self.where:
+            sql += f"\nWHERE {self.where}"
+        if self.keys:
+            sql += f"\nGROUP BY {', '.join(self.keys.values())}"
+        if self.labels:
+            sql = _labelled(sql, self.labels)
+        if self.order_by:
+            sql += f"\nORDER BY {', '.join(self.order_by)}"
+        return sql + ";"
+
+
+def _labelled(sql: str, labels: dict[str, Label]) -> str:
+    # Label joins run on the grouped rows, so only a handful of rows get strings.
+    joins, replaced = [], []
+    for i, (column, label) in enumerate(labels.items()):
+        join, expr = label.join("g", column, f"l{i}")
+        joins.append(join)
+        replaced.append(f"{expr} AS {column}")
+    return f"SELECT g.* REPLACE ({', '.join(replaced)})\nFROM (\n{sql}\n) g\n" + "\n".join(joins)
+
+
+def _match(agg: Aggregate) -> str | None:
+    # The row filter becomes an extra grouping key; only its TRUE groups are kept.
+    return f"COALESCE({agg.where}, false)" if agg.where else None
+
+
+def _group_exprs(agg: Aggregate) -> tuple[str, ...]:
+    match = _match(agg)
+    return tuple(agg.keys.values()) + ((match,) if match else ())
+
+
+def _group_keys(aggregates: list[Aggregate]) -> list[str]:
+    keys: list[str] = []
+    for agg in aggregates:
+        for expr in _group_exprs(agg):
+            if expr not in keys:
+                keys.append(expr)
+    return keys
+
+
+def _grouping_id(agg: Aggregate, keys: list[str]) -> int:
+    # GROUPING(k1..kn) sets bit (n-1-i) when key i is *not* part of the set.
+    exprs = _group_exprs(agg)
+    gid = 0
+    for i, expr in enumerate(keys):
+        if expr not in exprs:
+            gid |= 1 << (len(keys) - 1 - i)
+    return gid
+
+
+def _col(agg: Aggregate, alias: str) -> str:
+    return f'"{agg.name}.{alias}"'
+
+
+def fused_sql(relation: str, aggregates: list[Aggregate]) -> str:
+    keys = _group_keys(aggregates)
+    cols = [f"GROUPING({', '.join(keys)}) AS _grouping" if keys else "0 AS _grouping"]
+    for agg in aggregates:
+        cols += [f"{expr} AS {_col(agg, alias)}" for alias, expr in agg.keys.items()]
+        cols += [f"{expr} AS {_col(agg, alias)}" for alias, expr in agg.measures.items()]
+        if agg.where:
+            cols.append(f"{_match(agg)} AS {_col(agg, '_match')}")
+    sets = []
+    for agg in aggregates:
+        if _group_exprs(agg) not in sets:
+            sets.append(_group_exprs(agg))
+    sql = "SELECT\n    " + ",\n    ".join(cols) + f"\nFROM {relation}"
+    if keys:
+        grouping = ", ".join("(" + ", ".join(s) + ")" for s in sets)
+        sql += f"\nGROUP BY GROUPING SETS ({grouping})"
+    labels = {_col(agg, alias): label for agg in aggregates for alias, label in agg.labels.items()}
+    if labels:
+        sql = _labelled(sql, labels)
+    return sql + ";"
+
+
+def split(result: pa.Table, aggregates: list[Aggregate]) -> dict[str, pa.Table]:
+    """Cut a fused_sql() result back into one table per aggregate, in its own order."""
+    keys = _group_keys(aggregates)
+    parts = {}
+    for agg in aggregates:
+        mask = pc.equal(result["_grouping"], _grouping_id(agg, keys))
+        if agg.where:
+            mask = pc.and_(mask, result[f"{agg.name}._match"])
+        rows = result.filter(mask)
+        names = list(agg.keys) + list(agg.measures)
+        part = rows.select([f"{agg.name}.{alias}" for alias in names]).rename_columns(names)
+        if agg.order_by:
+            part = part.sort_by([_sort_key(o) for o in agg.order_by])
+        parts[agg.name] = part
+    return parts
+
+
+def _sort_key(order: str) -> tuple[str, str]:
+    col, _, direction = order.partition(" ")
+    return col, "descending" if direction.strip().upper() == "DESC" else "ascending"
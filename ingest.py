@@ -0,0 +1,533 @@
+import argparse
+import os
+import re
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+from backends import ParquetBackend, backend_from_env
+from query_cache import column_types, is_local, table_versions
+from queries import sql_literal
+from rollups import (
+    CHI_CUBE,
+    INGEST_LOG,
+    NYC_CUBE,
+    TRAFFIC_PATTERN,
+    TripCube,
+    source_tables,
+    target_table,
+    year_tables,
+)
+
+# -----------------------------
+# Ingestion / normalization
+# -----------------------------
+# The yellow taxi tables arrive with tpep_*_datetime as strings. Normalizing
+# them once stores native TIMESTAMPs plus small-int pickup_month/hour/dow
+# columns, so dashboard queries never parse timestamps at read time.
+
+PICKUP_PARTS = {
+    "pickup_month": "month",
+    "pickup_hour": "hour",
+    "pickup_dow": "dayofweek",
+}
+
+
+def is_normalized(types: dict[str, str]) -> bool:
+    return types.get("tpep_pickup_datetime") == "TIMESTAMP" and all(c in types for c in PICKUP_PARTS)
+
+
+def normalized_select(types: dict[str, str], source: str) -> str:
+    """SELECT that rewrites a raw yellow taxi relation into the typed layout."""
+    replace = [
+        f"CAST({col} AS TIMESTAMP) AS {col}"
+        for col in ("tpep_pickup_datetime", "tpep_dropoff_datetime")
+        if col in types and types[col] != "TIMESTAMP"
+    ]
+    existing = [c for c in PICKUP_PARTS if c in types]
+    star = "*"
+    if existing:
+        star += f" EXCLUDE ({', '.join(existing)})"
+    if replace:
+        star += f" REPLACE ({', '.join(replace)})"
+    parts = [
+        f"{fn}(CAST(tpep_pickup_datetime AS TIMESTAMP))::TINYINT AS {col}"
+        for col, fn in PICKUP_PARTS.items()
+    ]
+    return f"SELECT {star}, {', '.join(parts)} FROM {source}"
+
+
+def normalize_yellow(conn, database: str, table: str) -> bool:
+    """Rewrite one yellow taxi table in place; returns False if it was already typed."""
+    types = column_types(conn, database, table)
+    if not types:
+        raise LookupError(f"{database}.main.{table} not found")
+    if is_normalized(types):
+        return False
+    if conn.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE database_name = ? AND view_name = ?", [database, table]
+    ).fetchone()[0]:
+        raise ValueError(f"{table} is a view over files; normalize the files it reads instead")
+    target = f"{database}.main.{table}"
+    conn.execute(f"CREATE OR REPLACE TABLE {target} AS {normalized_select(types, target)};")
+    return True
+
+
+# -----------------------------
+# Incremental append (new monthly trip and traffic files)
+# -----------------------------
+# A month's drop (TLC Parquet, Chicago data portal CSV) is scanned once by
+# DuckDB's streaming readers, cast into its year table's column layout and
+# appended. Rows that don't parse or fall outside the declared month are
+# counted and dropped. Each append is logged in the source database with the
+# rowid of its first row and the table's version before and after it; the
+# dashboard's next rollup refresh folds just those rows into whichever rollup
+# catalog it owns (see rollups.appended_since), so an append costs O(new rows)
+# there too. This process never opens the dashboard's rollup file.
+
+STAGE = "ingest_stage"
+
+
+class SchemaError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class TripDataset:
+    name: str
+    cube: TripCube | None  # None: no trip cube, tables follow table_pattern
+    pickup: str  # timestamp that decides a row's month
+    timestamps: tuple[str, ...]
+    timestamp_formats: tuple[str, ...]  # tried when a timestamp arrives as text
+    required: tuple[str, ...]
+    layout: dict[str, str]  # column layout of a dataset's first table
+    cells: bool = False  # also feeds the pickup-cell grid
+    zones: bool = False  # also feeds the zone-pair counts
+    traffic: bool = False  # feeds the traffic speed rollup
+    table_pattern: str = ""
+    zone: str | None = None  # pickup location column, the secondary key of `cluster --by-zone`
+
+    def tables(self, tables) -> dict[int, str]:
+        """Year -> existing raw table of this dataset among `tables`."""
+        return source_tables(self.cube, tables) if self.cube else year_tables({}, self.table_pattern, tables)
+
+    def table(self, year: int) -> str:
+        """Raw table that holds (or will hold) `year`'s rows."""
+        return target_table(self.cube, year) if self.cube else self.table_pattern.format(year=year)
+
+
+NYC_DATASET = TripDataset(
+    name="nyc",
+    cube=NYC_CUBE,
+    pickup="tpep_pickup_datetime",
+    timestamps=("tpep_pickup_datetime", "tpep_dropoff_datetime"),
+    timestamp_formats=("%Y-%m-%d %H:%M:%S", "%m/%d/%Y %I:%M:%S %p"),
+    required=("VendorID", "tpep_pickup_datetime", "trip_distance", "payment_type", "tip_amount", "total_amount"),
+    layout={
+        "VendorID": "BIGINT",
+        "tpep_pickup_datetime": "TIMESTAMP",
+        "tpep_dropoff_datetime": "TIMESTAMP",
+        "passenger_count": "DOUBLE",
+        "trip_distance": "DOUBLE",
+        "RatecodeID": "DOUBLE",
+        "store_and_fwd_flag": "VARCHAR",
+        "PULocationID": "BIGINT",
+        "DOLocationID": "BIGINT",
+        "payment_type": "BIGINT",
+        "fare_amount": "DOUBLE",
+        "tip_amount": "DOUBLE",
+        "tolls_amount": "DOUBLE",
+        "total_amount": "DOUBLE",
+        "congestion_surcharge": "DOUBLE",
+        "pickup_month": "TINYINT",
+        "pickup_hour": "TINYINT",
+        "pickup_dow": "TINYINT",
+    },
+    zones=True,
+    zone="PULocationID",
+)
+
+CHI_DATASET = TripDataset(
+    name="chicago",
+    cube=CHI_CUBE,
+    pickup="trip_start_timestamp",
+    timestamps=("trip_start_timestamp", "trip_end_timestamp"),
+    timestamp_formats=("%m/%d/%Y %I:%M:%S %p", "%Y-%m-%d %H:%M:%S"),
+    required=("trip_start_timestamp", "trip_miles", "tips", "trip_total", "payment_type", "company"),
+    layout={
+        "trip_id": "VARCHAR",
+        "taxi_id": "VARCHAR",
+        "trip_start_timestamp": "TIMESTAMP",
+        "trip_end_timestamp": "TIMESTAMP",
+        "trip_seconds": "BIGINT",
+        "trip_miles": "DOUBLE",
+        "pickup_community_area": "BIGINT",
+        "dropoff_community_area": "BIGINT",
+        "fare": "DOUBLE",
+        "tips": "DOUBLE",
+        "tolls": "DOUBLE",
+        "extras": "DOUBLE",
+        "trip_total": "DOUBLE",
+        "payment_type": "VARCHAR",
+        "company": "VARCHAR",
+        "pickup_centroid_latitude": "DOUBLE",
+        "pickup_centroid_longitude": "DOUBLE",
+    },
+    cells=True,
+    zone="pickup_community_area",
+)
+
+TRAFFIC_DATASET = TripDataset(
+    name="traffic",
+    cube=None,
+    pickup="time",
+    timestamps=("time",),
+    timestamp_formats=("%m/%d/%Y %I:%M:%S %p", "%Y-%m-%d %H:%M:%S"),
+    required=("time", "segment_id", "speed"),
+    layout={
+        "time": "TIMESTAMP",
+        "segment_id": "BIGINT",
+        "speed": "DOUBLE",
+        "bus_count": "BIGINT",
+        "message_count": "BIGINT",
+    },
+    traffic=True,
+    table_pattern=TRAFFIC_PATTERN,
+    zone="segment_id",
+)
+
+DATASETS = {d.name: d for d in (NYC_DATASET, CHI_DATASET, TRAFFIC_DATASET)}
+
+
+def normalize_name(name: str) -> str:
+    """Match file columns to table columns: "Trip Start Timestamp" ~ trip_start_timestamp, VendorID ~ vendorid."""
+    return re.sub(r"\W+", "_", name.strip()).strip("_").lower()
+
+
+def file_month(path: str, month: str | None = None) -> date:
+    """First day of the month a file holds, from --month or a YYYY-MM in its name."""
+    m = re.search(r"(\d{4})-(\d{2})", month or Path(path).name)
+    if not m:
+        raise ValueError(f"can't tell which month {path} holds; pass --month YYYY-MM")
+    return date(int(m.group(1)), int(m.group(2)), 1)
+
+
+def reader_sql(path: str) -> str:
+    name = Path(path).name.lower()
+    if name.endswith(".parquet"):
+        return f"read_parquet({sql_literal(path)})"
+    if name.endswith((".csv", ".csv.gz")):
+        # Text as-is; stage_sql() does the casting so bad values become rejected rows, not errors.
+        return f"read_csv({sql_literal(path)}, all_varchar = true)"
+    raise ValueError(f"{path}: expected a .parquet or .csv file")
+
+
+def file_columns(conn, reader: str) -> dict[str, str]:
+    """Normalized name -> column name as the file spells it (schema only, no scan)."""
+    return {normalize_name(name): name for name, *_ in conn.execute(f"DESCRIBE SELECT * FROM {reader}").fetchall()}
+
+
+def target_layout(conn, database: str, dataset: TripDataset, table: str) -> dict[str, str]:
+    """Column layout to append into: the table's own, else its latest sibling year's, else the default."""
+    types = column_types(conn, database, table)
+    if not types:
+        existing = dataset.tables(table_versions(conn, database))
+        types = column_types(conn, database, existing[max(existing)]) if existing else dict(dataset.layout)
+    types.pop("month", None)  # hive partition column of the Parquet backend's views
+    return types
+
+
+def timestamp_sql(dataset: TripDataset, expr: str) -> str:
+    """`expr` as a TIMESTAMP, parsing text in any of the dataset's formats."""
+    formats = ", ".join(sql_literal(f) for f in dataset.timestamp_formats)
+    return f"COALESCE(TRY_CAST({expr} AS TIMESTAMP), try_strptime({expr}::VARCHAR, [{formats}]))"
+
+
+def stage_sql(dataset: TripDataset, layout: dict[str, str], columns: dict[str, str], reader: str,
+              month: date) -> str:
+    """Typed rows of one file in `layout`, plus an _ok flag for rows that parsed and fall in `month`."""
+    def src(col: str) -> str:
+        return '"' + columns[normalize_name(col)] + '"'
+
+    def parsed(col: str) -> str:
+        return timestamp_sql(dataset, src(col))
+
+    timestamps = {normalize_name(c) for c in dataset.timestamps}
+    pickup = parsed(dataset.pickup)
+    select = []
+    for col, type_ in layout.items():
+        key = normalize_name(col)
+        if key not in columns and col in PICKUP_PARTS:
+            select.append(f"{PICKUP_PARTS[col]}({pickup})::{type_} AS {col}")
+        elif key not in columns:
+            select.append(f'NULL::{type_} AS "{col}"')
+        elif key in timestamps:
+            select.append(f'CAST({parsed(col)} AS {type_}) AS "{col}"')
+        else:
+            select.append(f'TRY_CAST({src(col)} AS {type_}) AS "{col}"')
+
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    checks = [f"{pickup} >= DATE '{month}'", f"{pickup} < DATE '{next_month}'"]
+    types = {normalize_name(c): t for c, t in layout.items()}
+    for col in dataset.required:
+        key = normalize_name(col)
+        if key not in timestamps and key in types:
+            checks.append(f"({src(col)} IS NULL OR TRY_CAST({src(col)} AS {types[key]}) IS NOT NULL)")
+    select.append(f"COALESCE({' AND '.join(checks)}, false) AS _ok")
+    columns_sql = ",\n        ".join(select)
+    return f"""
+    SELECT
+        {columns_sql}
+    FROM {reader}
+    """
+
+
+def stage_file(conn, dataset: TripDataset, layout: dict[str, str], path: str, month: date) -> tuple[int, int]:
+    """Load one file's valid rows into the TEMP stage table; returns (rows, rejected)."""
+    reader = reader_sql(path)
+    columns = file_columns(conn, reader)
+    missing = [c for c in dataset.required if normalize_name(c) not in columns]
+    if missing:
+        raise SchemaError(f"{path}: missing required column(s) {', '.join(missing)}")
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE {STAGE} AS {stage_sql(dataset, layout, columns, reader, month)};")
+    rejected = conn.execute(f"SELECT count(*) FROM {STAGE} WHERE NOT _ok").fetchone()[0]
+    conn.execute(f"DELETE FROM {STAGE} WHERE NOT _ok;")
+    conn.execute(f"ALTER TABLE {STAGE} DROP COLUMN _ok;")
+    rows = conn.execute(f"SELECT count(*) FROM {STAGE}").fetchone()[0]
+    return rows, rejected
+
+
+def ensure_log(conn, database: str) -> None:
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {database}.main.{INGEST_LOG} (
+        dataset VARCHAR,
+        file VARCHAR,
+        file_bytes BIGINT,
+        target VARCHAR,
+        year SMALLINT,
+        month TINYINT,
+        rows BIGINT,
+        rejected BIGINT,
+        ingested_at TIMESTAMP,
+        first_row BIGINT,
+        version_before VARCHAR,
+        version_after VARCHAR
+    );
+    """)
+    for column, type_ in (("first_row", "BIGINT"), ("version_before", "VARCHAR"), ("version_after", "VARCHAR")):
+        # Logs written before appends were folded by the dashboard.
+        conn.execute(f"ALTER TABLE {database}.main.{INGEST_LOG} ADD COLUMN IF NOT EXISTS {column} {type_};")
+
+
+def append_file(conn, database: str, dataset: TripDataset, path: str, month: date, force: bool = False) -> dict:
+    """Append one monthly file to its year table and log it for the dashboard's rollups to fold.
+
+    The table is checkpointed before and after (local files), so the logged
+    versions are the ones the dashboard will see and the new rows keep their
+    rowids. If this process dies before logging the version after the append,
+    the next refresh rebuilds the year's partitions instead.
+    """
+    table = dataset.table(month.year)
+    file, size = Path(path).name, Path(path).stat().st_size
+    ensure_log(conn, database)
+    if not force and conn.execute(
+        f"SELECT count(*) FROM {database}.main.{INGEST_LOG} WHERE dataset = ? AND file = ? AND file_bytes = ?",
+        [dataset.name, file, size],
+    ).fetchone()[0]:
+        return {"file": file, "target": table, "skipped": True}
+
+    layout = target_layout(conn, database, dataset, table)
+    rows, rejected = stage_file(conn, dataset, layout, path, month)
+
+    local = is_local(conn, database)
+    if local:
+        conn.execute(f"CHECKPOINT {database};")
+    before = table_versions(conn, database).get(table)
+    target = f"{database}.main.{table}"
+    log = f"{database}.main.{INGEST_LOG}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {target} AS SELECT * FROM {STAGE} LIMIT 0;")
+        first_row = conn.execute(f"SELECT COALESCE(max(rowid) + 1, 0) FROM {target}").fetchone()[0]
+        conn.execute(f"INSERT INTO {target} BY NAME SELECT * FROM {STAGE};")
+        conn.execute(
+            f"INSERT INTO {log} VALUES (?, ?, ?, ?, ?, ?, ?, ?, now()::TIMESTAMP, ?, ?, NULL);",
+            [dataset.name, file, size, table, month.year, month.month, rows, rejected, first_row, before],
+        )
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+    if local:
+        conn.execute(f"CHECKPOINT {database};")
+    after = table_versions(conn, database)[table]
+    conn.execute(
+        f"UPDATE {log} SET version_after = ? WHERE target = ? AND file = ? AND first_row = ?",
+        [after, table, file, first_row],
+    )
+    conn.execute(f"DROP TABLE {STAGE};")
+    return {"file": file, "target": table, "rows": rows, "rejected": rejected, "folded": True}
+
+
+def append_parquet(conn, backend: ParquetBackend, dataset: TripDataset, path: str, month: date,
+                   force: bool = False) -> dict:
+    """Parquet backend: write the month as <data>/<table>/month=MM/<file>.parquet.
+
+    Nothing is logged: the dashboard sees the table's view change and rebuilds that year's rollups.
+    """
+    table = dataset.table(month.year)
+    out = Path(backend.directory) / table / f"month={month.month:02d}" / f"{Path(path).name.split('.')[0]}.parquet"
+    if out.exists() and not force:
+        return {"file": Path(path).name, "target": table, "skipped": True}
+    layout = target_layout(conn, backend.alias, dataset, table)
+    rows, rejected = stage_file(conn, dataset, layout, path, month)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    conn.execute(f"COPY {STAGE} TO {sql_literal(str(out))} (FORMAT parquet);")
+    conn.execute(f"DROP TABLE {STAGE};")
+    return {"file": Path(path).name, "target": table, "rows": rows, "rejected": rejected, "folded": False}
+
+
+# -----------------------------
+# Physical layout (clustering by pickup time)
+# -----------------------------
+# DuckDB keeps min/max statistics per row group (~122K rows), and a range
+# filter skips every row group whose [min, max] misses it. Rows loaded in
+# arbitrary order give each row group nearly the whole year's range, so a
+# month filter still reads the whole table. `cluster` rewrites each year table
+# sorted by pickup time (optionally month, then pickup zone, then time) and
+# reports how much the row groups' ranges overlap before and after.
+# Appended months land in order after the existing rows, so a clustered table
+# stays clustered.
+
+STATS_RANGE = re.compile(r"Min: ([^,\]]*), Max: ([^,\]]*)")
+NUMERIC_SEGMENTS = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER",
+                    "UBIGINT", "FLOAT", "DOUBLE")
+
+
+def row_group_ranges(conn, database: str, table: str, column: str) -> list[tuple]:
+    """(min, max) of `column` in each row group, read from the zone-map statistics (no scan)."""
+    rows = conn.execute(
+        "SELECT row_group_id, segment_type, stats FROM pragma_storage_info(?) "
+        "WHERE lower(column_name) = lower(?) AND segment_type <> 'VALIDITY'",
+        [f"{database}.main.{table}", column],
+    ).fetchall()
+    ranges: dict[int, tuple] = {}
+    for row_group, segment_type, stats in rows:
+        m = STATS_RANGE.search(stats or "")
+        if not m:
+            continue
+        # VARCHAR statistics keep only an 8-byte prefix; that prefix is all the zone map can prune on.
+        lo, hi = (float(v) if segment_type in NUMERIC_SEGMENTS else v for v in m.groups())
+        if row_group in ranges:
+            lo, hi = min(lo, ranges[row_group][0]), max(hi, ranges[row_group][1])
+        ranges[row_group] = (lo, hi)
+    return [ranges[rg] for rg in sorted(ranges)]
+
+
+def range_overlap(ranges: list[tuple]) -> float:
+    """Mean number of other row groups each row group's range overlaps (0 = perfectly clustered)."""
+    if len(ranges) < 2:
+        return 0.0
+    hits = sum(
+        1
+        for i, (lo, hi) in enumerate(ranges)
+        for j, (other_lo, other_hi) in enumerate(ranges)
+        if i != j and lo <= other_hi and other_lo <= hi
+    )
+    return hits / len(ranges)
+
+
+def layout_report(conn, database: str, dataset: TripDataset, table: str) -> dict:
+    columns = [dataset.pickup] + ([dataset.zone] if dataset.zone else [])
+    report = {"row_groups": len(row_group_ranges(conn, database, table, dataset.pickup))}
+    for column in columns:
+        report[column] = range_overlap(row_group_ranges(conn, database, table, column))
+    return report
+
+
+def cluster_table(conn, database: str, dataset: TripDataset, table: str, by_zone: bool = False) -> None:
+    """Rewrite one year table in place sorted by pickup time (and zone within each month)."""
+    if conn.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE database_name = ? AND view_name = ?", [database, table]
+    ).fetchone()[0]:
+        raise ValueError(f"{table} is a view over files; its Parquet files are already one month each")
+    pickup = timestamp_sql(dataset, f'"{dataset.pickup}"')
+    order = [pickup]
+    if by_zone and dataset.zone:
+        order = [f"date_trunc('month', {pickup})", f'"{dataset.zone}"', pickup]
+    target = f"{database}.main.{table}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM {target} ORDER BY {', '.join(order)};")
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="CommutePulse data maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("normalize", help="store yellow taxi pickup/dropoff times as TIMESTAMP with pickup_month/hour/dow")
+    append = sub.add_parser("append", help="append monthly trip or traffic files (Parquet or CSV); the dashboard "
+                                         "folds them into its rollups on its next refresh")
+    append.add_argument("dataset", choices=DATASETS)
+    append.add_argument("files", nargs="+")
+    append.add_argument("--month", help="YYYY-MM the files hold (default: parsed from each file name)")
+    append.add_argument("--force", action="store_true", help="append files the ingest log already has")
+    append.add_argument("--memory-limit", help="DuckDB memory_limit while scanning, e.g. 2GB")
+    cluster = sub.add_parser("cluster", help="rewrite trip/traffic year tables sorted by pickup time so range "
+                                             "filters skip row groups; reports row-group min/max overlap")
+    cluster.add_argument("datasets", nargs="*", help=f"datasets to cluster (default: all of {', '.join(DATASETS)})")
+    cluster.add_argument("--by-zone", action="store_true", help="sort by month, then pickup zone, then time")
+    cluster.add_argument("--check", action="store_true", help="only report the current row-group statistics")
+    cluster.add_argument("--memory-limit", help="DuckDB memory_limit while sorting, e.g. 4GB")
+    args = parser.parse_args(argv)
+
+    backend = backend_from_env(os.getenv("MOTHERDUCK_TOKEN", ""))
+    conn = backend.connect()
+    if args.command == "normalize":
+        for table in source_tables(NYC_CUBE, table_versions(conn, backend.alias)).values():
+            changed = normalize_yellow(conn, backend.alias, table)
+            print(f"{table}: {'normalized' if changed else 'already typed'}")
+    elif args.command == "append":
+        if args.memory_limit:
+            conn.execute(f"SET memory_limit = {sql_literal(args.memory_limit)};")
+        dataset = DATASETS[args.dataset]
+        for path in args.files:
+            month = file_month(path, args.month)
+            if isinstance(backend, ParquetBackend):
+                result = append_parquet(conn, backend, dataset, path, month, args.force)
+            else:
+                result = append_file(conn, backend.alias, dataset, path, month, args.force)
+            if result.get("skipped"):
+                print(f"{result['file']}: already in {result['target']}, skipped")
+                continue
+            fold = "folded into the rollups" if result["folded"] else "rollups rebuilt"
+            print(f"{result['file']}: {result['rows']:,} rows -> {result['target']} "
+                  f"({result['rejected']:,} rejected; {fold} on the dashboard's next refresh)")
+    elif args.command == "cluster":
+        unknown = [name for name in args.datasets if name not in DATASETS]
+        if unknown:
+            parser.error(f"unknown dataset(s) {', '.join(unknown)}; choose from {', '.join(DATASETS)}")
+        if args.memory_limit:
+            conn.execute(f"SET memory_limit = {sql_literal(args.memory_limit)};")
+        for dataset in (DATASETS[name] for name in args.datasets or DATASETS):
+            for table in dataset.tables(table_versions(conn, backend.alias)).values():
+                before = layout_report(conn, backend.alias, dataset, table)
+                if not args.check:
+                    try:
+                        cluster_table(conn, backend.alias, dataset, table, args.by_zone)
+                    except ValueError as exc:
+                        print(f"{table}: skipped ({exc})")
+                        continue
+                after = before if args.check else layout_report(conn, backend.alias, dataset, table)
+                overlap = "; ".join(
+                    f"{column} {before[column]:.1f}" + ("" if args.check else f" -> {after[column]:.1f}")
+                    for column in before if column != "row_groups"
+                )
+                print(f"{table}: {after['row_groups']} row groups; mean overlapping row groups: {overlap}")
+
+
+if __name__ == "__main__":
+    main()
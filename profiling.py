@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+
+# -----------------------------
+# Query & chart instrumentation
+# -----------------------------
+# Opt-in: queries submitted with a trace id run with DuckDB profiling on their
+# cursor, and charts drawn through the app's show_chart() are timed. Records go
+# to an in-memory ring (for the debug panel) and, if configured, a JSON-lines
+# log file for offline analysis.
+
+
+def profile_metrics(info: dict) -> dict:
+    """Headline numbers from DuckDB's JSON profiling output."""
+    return {
+        "cpu_ms": float(info.get("cpu_time", 0.0)) * 1000,
+        "rows_scanned": int(info.get("cumulative_rows_scanned", 0)),
+        "peak_buffer_bytes": int(info.get("system_peak_buffer_memory", 0)),
+    }
+
+
+def result_size(result) -> tuple[int | None, int | None]:
+    """(rows, bytes) of a query result, whatever form it came back in."""
+    if isinstance(result, pa.Table):
+        return result.num_rows, int(result.nbytes)
+    return None, None
+
+
+@dataclass
+class Record:
+    kind: str  # "query" or "chart"
+    name: str
+    trace: str
+    wall_ms: float
+    at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat(timespec="milliseconds"))
+    # query
+    queued_ms: float | None = None
+    rows: int | None = None
+    result_bytes: int | None = None
+    cpu_ms: float | None = None
+    rows_scanned: int | None = None
+    peak_buffer_bytes: int | None = None
+    plan: str | None = None
+    error: str | None = None
+    # chart
+    build_ms: float | None = None
+    serialize_ms: float | None = None
+    spec_bytes: int | None = None
+    cached: bool | None = None
+
+
+class Profiler:
+    """Thread-safe ring of recent records, optionally mirrored to a JSON-lines file."""
+
+    def __init__(self, max_records: int = 2000, log_path: str | None = None):
+        self._records: deque[Record] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self.log_path = log_path
+
+    def add(self, record: Record) -> None:
+        with self._lock:
+            self._records.append(record)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(asdict(record)) + "\n")
+
+    def records(self, trace: str | None = None) -> list[Record]:
+        """Records for one trace ("<session>:<run>"), a whole session ("<session>"), or all."""
+        with self._lock:
+            return [
+                r for r in self._records
+                if trace is None or r.trace == trace or r.trace.split(":", 1)[0] == trace
+            ]
+
+    def frame(self, trace: str | None = None) -> pd.DataFrame:
+        rows = [asdict(r) for r in self.records(trace)]
+        return pd.DataFrame(rows).drop(columns=["plan"]) if rows else pd.DataFrame()
+
+    def jsonl(self, trace: str | None = None) -> str:
+        return "\n".join(json.dumps(asdict(r)) for r in self.records(trace))
+
+    def summary(self, trace: str | None = None) -> pd.DataFrame:
+        """Per (kind, name): count, p50/max wall time and mean result size, slowest first."""
+        df = self.frame(trace)
+        if df.empty:
+            return df
+        return (
+            df.groupby(["kind", "name"])
+            .agg(
+                count=("wall_ms", "size"),
+                p50_ms=("wall_ms", "median"),
+                max_ms=("wall_ms", "max"),
+                rows_scanned=("rows_scanned", "max"),
+                result_bytes=("result_bytes", "mean"),
+            )
+            .sort_values("p50_ms", ascending=False)
+            .reset_index()
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.start) * 1000
+        return False
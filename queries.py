@@ -0,0 +1,711 @@
+import re
+from dataclasses import dataclass, replace
+from typing import Callable
+
+from fusion import Aggregate, Label
+from rollups import (
+    CHI_CUBE,
+    CTA_SOURCE,
+    DAY_OF_WEEK_DIM,
+    NYC_CUBE,
+    PAYMENT_TYPE_DIM,
+    PICKUP_CELLS,
+    STATION_INDEX,
+    TRAFFIC_PATTERN,
+    TRAFFIC_ROLLUP,
+    TRAFFIC_SAMPLE,
+    VENDOR_DIM,
+    ZONE_COUNTS,
+    ZONE_DIM,
+    ZONE_SOURCE,
+    CodeDim,
+    partition_table,
+    year_tables,
+)
+from spatial import center_lat, center_lon, dot_radius_m
+
+# -----------------------------
+# Year partitions
+# -----------------------------
+# Raw trip and traffic data, and the trip cubes built from them, are stored
+# one table per year. Queries never name a year table: they ask the context
+# for a dataset over the selected years and get a UNION ALL of just those
+# years' tables, so unselected years are never scanned at all.
+
+# dataset -> (fixed year tables, name pattern for other years)
+YEAR_TABLES: dict[str, tuple[dict[int, str], str]] = {
+    "nyc_trips": (NYC_CUBE.sources, NYC_CUBE.table_pattern),
+    "chi_trips": (CHI_CUBE.sources, CHI_CUBE.table_pattern),
+    "chi_traffic": ({}, TRAFFIC_PATTERN),
+}
+
+Partitions = tuple[tuple[str, int, str], ...]  # (dataset, year, table)
+
+
+def discover_partitions(tables) -> Partitions:
+    """Every (dataset, year, table) present among `tables` (e.g. table_versions() keys)."""
+    return tuple(
+        (dataset, year, table)
+        for dataset, (sources, pattern) in YEAR_TABLES.items()
+        for year, table in year_tables(sources, pattern, tables).items()
+    )
+
+
+def dashboard_sources(tables) -> list[str]:
+    """The source tables among `tables` that dashboard queries read, directly or via a rollup.
+
+    Rollups, their state table and ingest bookkeeping are left out, so writing
+    those doesn't look like a source change.
+    """
+    fixed = [table for table in (CTA_SOURCE, ZONE_SOURCE) if table in set(tables)]
+    return sorted({table for _, _, table in discover_partitions(tables)} | set(fixed))
+
+
+# The original 2019/2023 tables, for contexts built without a catalog lookup.
+DEFAULT_PARTITIONS = discover_partitions(
+    [*NYC_CUBE.sources.values(), *CHI_CUBE.sources.values(), *(TRAFFIC_PATTERN.format(year=y) for y in (2019, 2023))]
+)
+
+# -----------------------------
+# Named query registry
+# -----------------------------
+# Every dashboard query is a builder registered under a name and the tab that
+# renders it, so the app can run just the queries of the tab being viewed.
+
+
+@dataclass(frozen=True)
+class QueryContext:
+    source_db: str
+    rollup_db: str
+    years: tuple[int, ...] = (2019, 2023)
+    top_n: int = 8
+    grain: str = "day"  # date_trunc bucket for time-series charts (see downsample.py)
+    stations: tuple[str, ...] = ()  # CTA series to fetch; empty means the top_n ranked
+    map_level: int = 16  # spatial.py grid level for the pickup maps
+    partitions: Partitions = DEFAULT_PARTITIONS
+    dim_db: str = "memory"  # process-local catalog holding the zone dimension (rollups.load_zone_dim)
+
+    def src(self, table: str) -> str:
+        return f"{self.source_db}.main.{table}"
+
+    def available_years(self) -> list[int]:
+        return sorted({year for _, year, _ in self.partitions})
+
+    def year_tables(self, dataset: str) -> dict[int, str]:
+        """Selected years' tables of a year-partitioned dataset."""
+        return {year: table for name, year, table in sorted(self.partitions) if name == dataset and year in self.years}
+
+    def union_years(self, dataset: str, columns: str, alias: str | None = None) -> str:
+        """Subquery with `year, <columns>` over just the selected years' tables."""
+        return self._union(
+            dataset,
+            lambda year, table: f"SELECT {year} AS year, {columns} FROM {self.src(table)}",
+            lambda table: f"SELECT NULL::INTEGER AS year, {columns} FROM {self.src(table)}",
+            alias or dataset,
+        )
+
+    def _rollup(self, rollup: str, dataset: str) -> str:
+        """A per-year rollup table (built from `dataset`) over the selected years."""
+        def partition(year: int) -> str:
+            return f"{self.rollup_db}.main.{partition_table(rollup, year)}"
+        return self._union(
+            dataset,
+            lambda year, table: f"SELECT * FROM {partition(year)}",
+            lambda table: f"SELECT * FROM {partition(self._all_years(dataset)[table])}",
+            rollup,
+        )
+
+    def _all_years(self, dataset: str) -> dict[str, int]:
+        return {table: year for name, year, table in self.partitions if name == dataset}
+
+    def _union(self, dataset: str, branch, empty, alias: str) -> str:
+        branches = [branch(year, table) for year, table in self.year_tables(dataset).items()]
+        if not branches:
+            # No selected year has a table: an empty relation with the right columns.
+            tables = list(self._all_years(dataset))
+            if not tables:
+                raise LookupError(f"no {dataset} tables in {self.source_db}")
+            branches = [f"{empty(tables[0])} WHERE false"]
+        return "(\n      " + "\n      UNION ALL\n      ".join(branches) + f"\n    ) AS {alias}"
+
+    @property
+    def nyc_trips(self) -> str:
+        """NYC trip cube over the selected years."""
+        return self._rollup(NYC_CUBE.table, "nyc_trips")
+
+    @property
+    def chi_trips(self) -> str:
+        """Chicago trip cube over the selected years."""
+        return self._rollup(CHI_CUBE.table, "chi_trips")
+
+    @property
+    def nyc_zone_counts(self) -> str:
+        """NYC (PULocationID, DOLocationID) trip counts over the selected years."""
+        return self._rollup(ZONE_COUNTS, "nyc_trips")
+
+    @property
+    def chi_traffic(self) -> str:
+        """Chicago traffic speed per (date, hour) over the selected years."""
+        return self._rollup(TRAFFIC_ROLLUP, "chi_traffic")
+
+    @property
+    def traffic_sample(self) -> str:
+        """Weighted traffic sample (fast preview) over the selected years."""
+        return self._rollup(TRAFFIC_SAMPLE, "chi_traffic")
+
+    @property
+    def zone_dim(self) -> str:
+        return f"{self.dim_db}.main.{ZONE_DIM}"
+
+    def label(self, dim: CodeDim) -> Label:
+        return Label(f"{self.dim_db}.main.{dim.table}", None if dim.other is None else sql_literal(dim.other))
+
+    @property
+    def pickup_cells(self) -> str:
+        return f"{self.rollup_db}.main.{PICKUP_CELLS}"
+
+    @property
+    def cta_stations(self) -> str:
+        return f"{self.rollup_db}.main.{STATION_INDEX}"
+
+    def with_(self, **changes) -> "QueryContext":
+        return replace(self, **changes)
+
+
+QueryBuilder = Callable[[QueryContext], str]
+
+QUERIES: dict[str, QueryBuilder] = {}
+TAB_QUERIES: dict[str, list[str]] = {}
+
+
+def query(name: str, tab: str | None):
+    """Register a builder; tab=None keeps it out of tab prefetch (the app fetches it itself)."""
+    def register(builder: QueryBuilder) -> QueryBuilder:
+        if name in QUERIES:
+            raise ValueError(f"query {name!r} registered twice")
+        QUERIES[name] = builder
+        if tab is not None:
+            TAB_QUERIES.setdefault(tab, []).append(name)
+        return builder
+    return register
+
+
+# exact query name -> its sampled preview (see "Preview estimates" below).
+# PREVIEWS read the stratified samples kept with the exact rollups;
+# CATALOG_PREVIEWS only run against the preview catalog (rollups.build_preview).
+PREVIEWS: dict[str, str] = {}
+CATALOG_PREVIEWS: dict[str, str] = {}
+
+
+def preview(of: str, catalog: bool = False):
+    """Register a builder as the fast approximate version of query `of`."""
+    def register(builder: QueryBuilder) -> QueryBuilder:
+        registry = CATALOG_PREVIEWS if catalog else PREVIEWS
+        registry[of] = f"{of}_preview"
+        return query(registry[of], tab=None)(builder)
+    return register
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build(name: str, ctx: QueryContext) -> str:
+    return QUERIES[name](ctx)
+
+
+# Widget-driven values (Top-N, station list, time grain) are written as $name
+# placeholders and bound at execution, so a query's SQL text only changes with
+# its structure and one prepared plan and cache-key prefix serves every slider
+# position. The selected years stay structural: they pick the partitions a
+# query unions, and a literal IN list is what lets DuckDB prune the pickup-cell
+# table by zone map (a bound list filter scans it 20% slower).
+PARAM = re.compile(r"\$([a-z_]+)\b")
+
+
+def context_params(ctx: QueryContext) -> dict:
+    return {
+        "top_n": ctx.top_n,
+        "stations": list(ctx.stations),
+        "grain": ctx.grain,
+    }
+
+
+def bind_params(sql: str, ctx: QueryContext) -> dict:
+    """Values for the $placeholders that `sql` uses."""
+    values = context_params(ctx)
+    return {name: values[name] for name in dict.fromkeys(PARAM.findall(sql))}
+
+
+def bind(name: str, ctx: QueryContext) -> tuple[str, dict]:
+    """A registered query's SQL and its bound parameters."""
+    sql = build(name, ctx)
+    return sql, bind_params(sql, ctx)
+
+
+# -----------------------------
+# KPI row
+# -----------------------------
+def _recovery(ctx: QueryContext, cube: Callable[[QueryContext], str]) -> str:
+    # Latest selected year against the earliest one.
+    base, current = min(ctx.years), max(ctx.years)
+    relation = cube(ctx.with_(years=(base, current)))
+    return f"""
+    WITH totals AS (
+        SELECT
+            COALESCE(SUM(trips) FILTER (WHERE year = {base}), 0)::BIGINT AS base_trips,
+            COALESCE(SUM(trips) FILTER (WHERE year = {current}), 0)::BIGINT AS current_trips
+        FROM {relation}
+    )
+    SELECT
+        {base} AS base_year,
+        {current} AS current_year,
+        base_trips,
+        current_trips,
+        CASE WHEN base_trips > 0 THEN 100.0 * current_trips / base_trips ELSE NULL END AS recovery_pct
+    FROM totals;
+    """
+
+
+@query("nyc_kpi", tab="kpi")
+def sql_nyc_kpi(ctx: QueryContext) -> str:
+    return _recovery(ctx, lambda c: c.nyc_trips)
+
+
+@query("chi_kpi", tab="kpi")
+def sql_chi_kpi(ctx: QueryContext) -> str:
+    return _recovery(ctx, lambda c: c.chi_trips)
+
+
+@query("cta_total", tab="kpi")
+def sql_cta_total(ctx: QueryContext) -> str:
+    return f"SELECT SUM(rides)::BIGINT AS total_rides FROM {ctx.src('cta_l_ridership')};"
+
+
+@query("traffic_kpi", tab="kpi")
+def sql_traffic_kpi(ctx: QueryContext) -> str:
+    return f"""
+    SELECT year, SUM(speed_sum) / SUM(readings) AS avg_speed
+    FROM {ctx.chi_traffic}
+    GROUP BY year
+    ORDER BY year;
+    """
+
+
+# -----------------------------
+# Trip cube chart groups (fused per tab)
+# -----------------------------
+# Each taxi tab's charts aggregate one cube; they're declared as Aggregates so
+# the app can compute a whole tab in one fused pass (see fusion.py). The
+# per-chart builders below render the same aggregate as standalone SQL.
+# Payment type, vendor and day of week are grouped on their small-int codes;
+# the labels come from the code dimensions (rollups.CODE_DIMS).
+
+FusedGroup = Callable[[QueryContext], tuple[str, list[Aggregate]]]
+
+FUSED: dict[str, list[FusedGroup]] = {}
+
+
+def fused(tab: str):
+    def register(group: FusedGroup) -> FusedGroup:
+        FUSED.setdefault(tab, []).append(group)
+        return group
+    return register
+
+
+def _in_years(ctx: QueryContext) -> str:
+    return f"year IN ({','.join(str(y) for y in ctx.years)})"
+
+
+def _monthly(name: str) -> Aggregate:
+    return Aggregate(
+        name,
+        keys={"year": "year", "month": "month"},
+        measures={
+            "trip_count": "SUM(paid_trips)::BIGINT",
+            "avg_distance": "SUM(paid_distance) / SUM(paid_trips)",
+            "avg_revenue": "SUM(paid_revenue) / SUM(paid_trips)",
+            "total_revenue": "SUM(paid_revenue)",
+        },
+        where="paid_trips > 0",
+        order_by=("year", "month"),
+    )
+
+
+def _hourly(name: str) -> Aggregate:
+    return Aggregate(
+        name,
+        keys={"year": "year", "hour": "hour"},
+        measures={"trips": "SUM(trips)::BIGINT"},
+        order_by=("year", "hour"),
+    )
+
+
+# The year selection is applied by the cube relation itself (only the selected
+# years' partition tables), so no aggregate needs a year filter.
+
+
+def nyc_trip_aggregates(ctx: QueryContext) -> dict[str, Aggregate]:
+    aggregates = [
+        _monthly("nyc_monthly"),
+        _hourly("nyc_hour"),
+        Aggregate(
+            "nyc_payment_type",
+            keys={"year": "year", "payment_type_desc": PAYMENT_TYPE_DIM.code("payment_type")},
+            measures={"trips": "SUM(trips)::BIGINT"},
+            order_by=("year", "trips DESC"),
+            labels={"payment_type_desc": ctx.label(PAYMENT_TYPE_DIM)},
+        ),
+        Aggregate(
+            "nyc_vendor",
+            keys={"year": "year", "vendor_name": VENDOR_DIM.code("vendor")},
+            measures={"trips": "SUM(trips)::BIGINT"},
+            order_by=("year", "trips DESC"),
+            labels={"vendor_name": ctx.label(VENDOR_DIM)},
+        ),
+        Aggregate(
+            "nyc_tips",
+            keys={"year": "year", "payment_type_desc": "payment_type"},
+            measures={"avg_tip_pct": "SUM(tip_ratio_sum) / SUM(tipped_trips) * 100"},
+            where="payment_type IN (1, 2) AND tipped_trips > 0",
+            order_by=("year", "avg_tip_pct DESC"),
+            labels={"payment_type_desc": ctx.label(PAYMENT_TYPE_DIM)},
+        ),
+    ]
+    return {a.name: a for a in aggregates}
+
+
+def chi_trip_aggregates(ctx: QueryContext) -> dict[str, Aggregate]:
+    aggregates = [
+        _monthly("chi_monthly"),
+        _hourly("chi_hour"),
+        Aggregate(
+            "chi_heatmap",
+            keys={"year": "year", "hour": "hour", "day_of_week": "dow"},
+            measures={"trips": "SUM(trips)::BIGINT"},
+            order_by=("year", "hour", "day_of_week"),
+            labels={"day_of_week": ctx.label(DAY_OF_WEEK_DIM)},
+        ),
+    ]
+    return {a.name: a for a in aggregates}
+
+
+@fused(tab="nyc")
+def nyc_trip_charts(ctx: QueryContext) -> tuple[str, list[Aggregate]]:
+    return ctx.nyc_trips, list(nyc_trip_aggregates(ctx).values())
+
+
+@fused(tab="chicago")
+def chi_trip_charts(ctx: QueryContext) -> tuple[str, list[Aggregate]]:
+    return ctx.chi_trips, list(chi_trip_aggregates(ctx).values())
+
+
+# -----------------------------
+# NYC Taxi tab
+# -----------------------------
+@query("nyc_monthly", tab="nyc")
+def sql_nyc_monthly(ctx: QueryContext) -> str:
+    return nyc_trip_aggregates(ctx)["nyc_monthly"].sql(ctx.nyc_trips)
+
+
+@query("nyc_hour", tab="nyc")
+def sql_nyc_hour(ctx: QueryContext) -> str:
+    return nyc_trip_aggregates(ctx)["nyc_hour"].sql(ctx.nyc_trips)
+
+
+@query("nyc_payment_type", tab="nyc")
+def sql_nyc_payment_type(ctx: QueryContext) -> str:
+    return nyc_trip_aggregates(ctx)["nyc_payment_type"].sql(ctx.nyc_trips)
+
+
+@query("nyc_vendor", tab="nyc")
+def sql_nyc_vendor(ctx: QueryContext) -> str:
+    return nyc_trip_aggregates(ctx)["nyc_vendor"].sql(ctx.nyc_trips)
+
+
+@query("nyc_tips", tab="nyc")
+def sql_nyc_tips(ctx: QueryContext) -> str:
+    return nyc_trip_aggregates(ctx)["nyc_tips"].sql(ctx.nyc_trips)
+
+
+# -----------------------------
+# Chicago Taxi tab
+# -----------------------------
+@query("chi_monthly", tab="chicago")
+def sql_chi_monthly(ctx: QueryContext) -> str:
+    return chi_trip_aggregates(ctx)["chi_monthly"].sql(ctx.chi_trips)
+
+
+@query("chi_hour", tab="chicago")
+def sql_chi_hour(ctx: QueryContext) -> str:
+    return chi_trip_aggregates(ctx)["chi_hour"].sql(ctx.chi_trips)
+
+
+@query("chi_heatmap", tab="chicago")
+def sql_chi_heatmap(ctx: QueryContext) -> str:
+    return chi_trip_aggregates(ctx)["chi_heatmap"].sql(ctx.chi_trips)
+
+
+# -----------------------------
+# Chicago Traffic & L-Rides tab
+# -----------------------------
+@query("chi_speed", tab="traffic")
+def sql_chi_speed(ctx: QueryContext) -> str:
+    return f"""
+    SELECT year, hour, SUM(speed_sum) / SUM(readings) AS avg_speed
+    FROM {ctx.chi_traffic}
+    GROUP BY 1,2
+    ORDER BY 1,2;
+    """
+
+
+@query("chi_speed_day", tab="traffic")
+def sql_chi_speed_day(ctx: QueryContext) -> str:
+    join, day_name = ctx.label(DAY_OF_WEEK_DIM).join("s", "day_of_week_num", "d")
+    return f"""
+    SELECT s.year, s.day_of_week_num, {day_name} AS day_of_week, s.avg_speed
+    FROM (
+        SELECT year, dayofweek(date) AS day_of_week_num, SUM(speed_sum) / SUM(readings) AS avg_speed
+        FROM {ctx.chi_traffic}
+        GROUP BY 1, 2
+    ) s
+    {join}
+    ORDER BY 1, 2;
+    """
+
+
+# Preview estimates: the same charts from the stratified traffic sample, with
+# a 95% interval per point. Means are weighted by each month's sampling rate;
+# the interval uses the unweighted standard error, which is close because
+# every month is sampled to about the same size.
+
+
+def _speed_estimate(keys: dict[str, str], relation: str) -> str:
+    cols = ",\n          ".join(f"{expr} AS {alias}" for alias, expr in keys.items())
+    return f"""
+        SELECT
+          {cols},
+          SUM(weight * speed) / SUM(weight) AS avg_speed,
+          avg_speed - 1.96 * stddev_samp(speed) / sqrt(COUNT(*)) AS ci_low,
+          avg_speed + 1.96 * stddev_samp(speed) / sqrt(COUNT(*)) AS ci_high,
+          COUNT(*) AS sample_rows
+        FROM {relation}
+        GROUP BY ALL
+    """
+
+
+@preview(of="chi_speed")
+def sql_chi_speed_preview(ctx: QueryContext) -> str:
+    return f"""
+    {_speed_estimate({"year": "year", "hour": "hour(time)"}, ctx.traffic_sample)}
+    ORDER BY 1, 2;
+    """
+
+
+@preview(of="chi_speed_day")
+def sql_chi_speed_day_preview(ctx: QueryContext) -> str:
+    join, day_name = ctx.label(DAY_OF_WEEK_DIM).join("s", "day_of_week_num", "d")
+    return f"""
+    SELECT s.year, s.day_of_week_num, {day_name} AS day_of_week, s.avg_speed, s.ci_low, s.ci_high, s.sample_rows
+    FROM ({_speed_estimate({"year": "year", "day_of_week_num": "dayofweek(time)"}, ctx.traffic_sample)}) s
+    {join}
+    ORDER BY 1, 2;
+    """
+
+
+# Preview-catalog counts: each month was sampled on its own with weight w
+# (sample_weight), so a count of n rows out of the month's N has variance
+# n * (w - 1) * (1 - n / N); months are independent, so variances add.
+
+
+def _count_estimate(relation: str, keys: tuple[str, ...], count: str, alias: str,
+                    sums: tuple[str, ...] = (), measures: dict[str, str] | None = None) -> str:
+    cells = ", ".join(dict.fromkeys(("year", "month", *keys)))
+    out = ", ".join(("year", *keys))
+    extra = "".join(f"SUM({c}) AS {c}, " for c in sums)
+    selected = "".join(f"{expr} AS {name}, " for name, expr in (measures or {}).items())
+    return f"""
+    WITH cells AS (
+        SELECT {cells}, SUM({count}) AS n, SUM(SUM(trips)) OVER (PARTITION BY year, month) AS month_n,
+               {extra}SUM(trips) / any_value(sample_weight) AS sampled, any_value(sample_weight) AS w
+        FROM {relation}
+        GROUP BY {cells}
+    )
+    SELECT
+        {out},
+        SUM(n)::BIGINT AS {alias},
+        {selected}SUM(n) - 1.96 * sqrt(SUM(n * (w - 1) * (1 - n / month_n))) AS ci_low,
+        SUM(n) + 1.96 * sqrt(SUM(n * (w - 1) * (1 - n / month_n))) AS ci_high,
+        round(SUM(sampled))::BIGINT AS sample_rows
+    FROM cells
+    GROUP BY {out}
+    HAVING SUM(n) > 0
+    ORDER BY {out};
+    """
+
+
+def _monthly_estimate(relation: str) -> str:
+    return _count_estimate(
+        relation, ("month",), "paid_trips", "trip_count", sums=("paid_distance", "paid_revenue"),
+        measures={
+            "avg_distance": "SUM(paid_distance) / SUM(n)",
+            "avg_revenue": "SUM(paid_revenue) / SUM(n)",
+            "total_revenue": "SUM(paid_revenue)",
+        },
+    )
+
+
+@preview(of="nyc_monthly", catalog=True)
+def sql_nyc_monthly_preview(ctx: QueryContext) -> str:
+    return _monthly_estimate(ctx.nyc_trips)
+
+
+@preview(of="nyc_hour", catalog=True)
+def sql_nyc_hour_preview(ctx: QueryContext) -> str:
+    return _count_estimate(ctx.nyc_trips, ("hour",), "trips", "trips")
+
+
+@preview(of="chi_monthly", catalog=True)
+def sql_chi_monthly_preview(ctx: QueryContext) -> str:
+    return _monthly_estimate(ctx.chi_trips)
+
+
+@preview(of="chi_hour", catalog=True)
+def sql_chi_hour_preview(ctx: QueryContext) -> str:
+    return _count_estimate(ctx.chi_trips, ("hour",), "trips", "trips")
+
+
+@query("cta_date_span", tab="traffic")
+def sql_cta_date_span(ctx: QueryContext) -> str:
+    return f"SELECT MIN(first_date) AS first_date, MAX(last_date) AS last_date FROM {ctx.cta_stations};"
+
+
+@query("cta_station_ranking", tab="traffic")
+def sql_cta_station_ranking(ctx: QueryContext) -> str:
+    return f"SELECT stationname, total_rides FROM {ctx.cta_stations} ORDER BY total_rides DESC, stationname;"
+
+
+@query("cta_topstations", tab=None)
+def sql_cta_topstations(ctx: QueryContext) -> str:
+    # Coarser grains report the average daily rides within each bucket, so the
+    # y-axis keeps its meaning whichever grain the chart ends up at.
+    if ctx.stations:
+        stations = "list_contains($stations, stationname)"
+    else:
+        stations = (f"stationname IN (SELECT stationname FROM {ctx.cta_stations} "
+                    "ORDER BY total_rides DESC, stationname LIMIT $top_n)")
+    return f"""
+    SELECT stationname, date_trunc($grain, date::DATE)::DATE AS date, AVG(rides) AS rides
+    FROM {ctx.src('cta_l_ridership')}
+    WHERE {stations}
+    GROUP BY 1, 2
+    ORDER BY stationname, date;
+    """
+
+
+# -----------------------------
+# NYC vs. Chicago tab
+# -----------------------------
+@query("combined_monthly", tab="comparison")
+def sql_combined_monthly(ctx: QueryContext) -> str:
+    return f"""
+    SELECT 'NYC' AS city, year, month, SUM(trips)::BIGINT AS trip_count
+    FROM {ctx.nyc_trips}
+    GROUP BY 1, 2, 3
+    UNION ALL
+    SELECT 'Chicago' AS city, year, month, SUM(trips)::BIGINT AS trip_count
+    FROM {ctx.chi_trips}
+    GROUP BY 1, 2, 3
+    ORDER BY city, year, month;
+    """
+
+
+# The per-year panels below are fetched once per selected year with a
+# single-year context (ctx.with_(years=(year,))).
+
+
+# The NYC zone views read the zone-pair counts and join the zone dimension
+# only after collapsing them to one row per zone (or borough pair).
+
+
+def _top_zones(ctx: QueryContext, side: str) -> str:
+    return f"""
+    WITH counts AS (
+        SELECT {side}LocationID AS LocationID, SUM(trips) AS trips
+        FROM {ctx.nyc_zone_counts}
+        GROUP BY 1
+    )
+    SELECT
+        z.Zone,
+        z.Borough,
+        SUM(c.trips)::BIGINT AS trips
+    FROM counts c
+    JOIN {ctx.zone_dim} z
+        ON c.LocationID = z.LocationID
+    GROUP BY z.Zone, z.Borough
+    ORDER BY trips DESC
+    LIMIT 20;
+    """
+
+
+@query("nyc_zones", tab=None)
+def sql_nyc_zones(ctx: QueryContext) -> str:
+    return _top_zones(ctx, "PU")
+
+
+@query("nyc_dropoff_zones", tab=None)
+def sql_nyc_dropoff_zones(ctx: QueryContext) -> str:
+    return _top_zones(ctx, "DO")
+
+
+@query("nyc_borough_flows", tab=None)
+def sql_nyc_borough_flows(ctx: QueryContext) -> str:
+    return f"""
+    WITH counts AS (
+        SELECT PULocationID, DOLocationID, SUM(trips) AS trips
+        FROM {ctx.nyc_zone_counts}
+        GROUP BY ALL
+    )
+    SELECT
+        pickup.Borough AS pickup_borough,
+        dropoff.Borough AS dropoff_borough,
+        SUM(counts.trips)::BIGINT AS trips
+    FROM counts
+    JOIN {ctx.zone_dim} pickup
+        ON counts.PULocationID = pickup.LocationID
+    JOIN {ctx.zone_dim} dropoff
+        ON counts.DOLocationID = dropoff.LocationID
+    GROUP BY ALL
+    ORDER BY trips DESC;
+    """
+
+
+@query("chi_cell_counts", tab="comparison")
+def sql_chi_cell_counts(ctx: QueryContext) -> str:
+    # Cells per level in the busiest selected year, for picking a level all maps share.
+    return f"""
+    SELECT level, MAX(cells) AS cells
+    FROM (
+        SELECT year, level, COUNT(*) AS cells
+        FROM {ctx.pickup_cells}
+        WHERE {_in_years(ctx)}
+        GROUP BY ALL
+    )
+    GROUP BY level
+    ORDER BY level;
+    """
+
+
+@query("chi_pts", tab=None)
+def sql_chi_pts(ctx: QueryContext) -> str:
+    level = ctx.map_level
+    return f"""
+    SELECT
+        {center_lat('cy', level)} AS lat,
+        {center_lon('cx', level)} AS lon,
+        trips,
+        {dot_radius_m(level):.1f} * sqrt(trips / MAX(trips) OVER ()) AS radius
+    FROM {ctx.pickup_cells}
+    WHERE {_in_years(ctx)} AND level = {level}
+    ORDER BY trips DESC;
+    """
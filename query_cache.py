@@ -0,0 +1,334 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable
+
+import pyarrow as pa
+
+from dispatch import completed
+
+# -----------------------------
+# Result cache for dashboard queries
+# -----------------------------
+# Streamlit re-executes app.py on every interaction, so anything that must
+# survive a rerun lives here and is held by an st.cache_resource in the app.
+
+# String literals are kept verbatim; only whitespace outside them is collapsed.
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse formatting-only differences (indentation, newlines, trailing ';')."""
+    def _sub(m: re.Match) -> str:
+        tok = m.group(0)
+        return tok if tok[0] in "'\"" else " "
+    return _SQL_TOKEN.sub(_sub, sql).strip().rstrip(";").rstrip()
+
+
+def cache_key(sql: str, params: dict | list | None = None, fingerprint: str = "") -> str:
+    if isinstance(params, dict):
+        params = sorted(params.items())
+    raw = "\x1f".join([normalize_sql(sql), repr(params), fingerprint])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def table_versions(conn, database: str) -> dict[str, str]:
+    """Per-table version stamps for `database` from catalog and storage metadata (no scans).
+
+    A table's stamp is `estimated_size:column_count`, so it changes on appends
+    and schema changes. In a local DuckDB database it also carries the exact
+    row count (a DELETE leaves the estimated size alone; counting reads only
+    the delete markers, not column data) and a digest of where each column
+    segment is stored and whether it has pending updates: a checkpoint writes
+    changed segments to new blocks, so an UPDATE or rewrite that keeps the row
+    count changes the stamp too. (Before its checkpoint an UPDATE shows as
+    pending updates; a second one to the same segments is seen once
+    checkpointed.) Remote (MotherDuck) tables only get the size stamp. Views
+    (e.g. the Parquet backend's) are versioned by their definition.
+    """
+    rows = conn.execute(
+        """
+        SELECT schema_name, table_name, estimated_size::VARCHAR || ':' || column_count::VARCHAR, true
+        FROM duckdb_tables()
+        WHERE database_name = ?
+        UNION ALL
+        SELECT schema_name, view_name, 'view:' || md5(sql), false
+        FROM duckdb_views()
+        WHERE database_name = ? AND NOT internal
+        ORDER BY 1, 2
+        """,
+        [database, database],
+    ).fetchall()
+    local = is_local(conn, database)
+    versions = {}
+    for schema, table, version, is_table in rows:
+        if schema != "main":
+            continue
+        if is_table and local:
+            count = conn.execute(f"SELECT count(*) FROM {database}.main.{table}").fetchone()[0]
+            version += f":{count}:" + storage_digest(conn, f"{database}.main.{table}")
+        versions[table] = version
+    return versions
+
+
+def is_local(conn, database: str) -> bool:
+    """Whether `database` is a DuckDB file or in-memory catalog of this process (not MotherDuck)."""
+    row = conn.execute("SELECT type = 'duckdb' FROM duckdb_databases() WHERE database_name = ?", [database]).fetchone()
+    return bool(row and row[0])
+
+
+def storage_digest(conn, table: str) -> str:
+    """Digest of a table's segment placement (blocks, counts, pending updates)."""
+    return conn.execute(
+        """
+        SELECT md5(string_agg(concat_ws(',', row_group_id, column_id, column_path, segment_id, block_id,
+                                        block_offset, count, has_updates), ';'
+                              ORDER BY row_group_id, column_id, column_path, segment_id))[:12]
+        FROM pragma_storage_info(?)
+        """,
+        [table],
+    ).fetchone()[0] or ""
+
+
+def column_types(conn, database: str, table: str) -> dict[str, str]:
+    rows = conn.execute(
+        """
+        SELECT column_name, data_type
+        FROM duckdb_columns()
+        WHERE database_name = ? AND schema_name = 'main' AND table_name = ?
+        """,
+        [database, table],
+    ).fetchall()
+    return dict(rows)
+
+
+def source_fingerprint(conn, database: str, select: Callable[[list[str]], list[str]] | None = None) -> str:
+    """Cheap version stamp of the tables in `database` (those `select` picks from the names, if given)."""
+    versions = table_versions(conn, database)
+    if select is not None:
+        versions = {table: versions[table] for table in select(list(versions))}
+    versions = sorted(versions.items())
+    return hashlib.sha256(repr(versions).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    value: pa.Table
+    nbytes: int
+    expires_at: float
+
+
+# Expiry (wall clock) of a result persisted to disk, in its Arrow schema metadata.
+_EXPIRES_AT = b"commutepulse.expires_at"
+
+
+class ResultCache:
+    """Thread-safe LRU of query results with a byte budget and per-entry TTL.
+
+    One instance is shared by every session in the process. submit() coalesces
+    concurrent requests for the same key into a single execution, and with a
+    `directory` Arrow results are also persisted there (up to max_disk_bytes),
+    so other processes and restarts start warm.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float, directory: str | None = None,
+                 max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._flights: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> pa.Table | None:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+        return value
+
+    def submit(self, key: str, run: Callable[[], Future], ttl: float | None = None,
+               store: bool = True, refresh: bool = False) -> Future:
+        """Future for `key`: the cached result, the query already in flight, or run().
+
+        However many sessions ask for a key at once, run() is called once and
+        they all share its future. With store=False the result itself isn't
+        cached (the caller caches parts of it) but requests are still coalesced.
+        refresh=True skips the cached result and replaces it.
+        """
+        lookup = store and not refresh
+        value = self.get(key) if lookup else None
+        if value is not None:
+            return completed(value)
+        with self._lock:
+            value = self._lookup(key) if lookup else None
+            if value is not None:
+                return completed(value)
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight
+            flight = self._flights[key] = Future()
+        try:
+            fut = run()
+        except Exception as exc:
+            self._land(key, flight, None, ttl, store, exc)
+            return flight
+        fut.add_done_callback(lambda f: self._land(key, flight, f.result() if f.exception() is None else None,
+                                                   ttl, store, f.exception()))
+        return flight
+
+    def _land(self, key: str, flight: Future, value, ttl, store: bool, exc: BaseException | None) -> None:
+        # Cache first and retire the flight last, so a caller arriving in
+        # between finds one or the other and never starts a second run.
+        try:
+            if exc is None and store:
+                self.put(key, value, ttl)
+        finally:
+            if exc is None:
+                flight.set_result(value)
+            else:
+                flight.set_exception(exc)
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def put(self, key: str, value: pa.Table, ttl: float | None = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._write(key, value, ttl)
+        self._insert(key, value, ttl)
+
+    def _insert(self, key: str, value: pa.Table, ttl: float) -> None:
+        nbytes = int(value.nbytes)
+        if nbytes > self.max_bytes:
+            return  # would evict everything else and still not fit
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, nbytes, time.monotonic() + ttl)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Empty the in-memory tier; files on disk are left for other processes."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.disk_hits) / lookups) if lookups else 0.0,
+                "disk_hits": self.disk_hits,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _lookup(self, key: str) -> pa.Table | None:
+        # Memory tier only; caller holds the lock.
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+
+    # -- disk tier: one Arrow IPC file per key --
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.arrow")
+
+    def _read(self, key: str) -> pa.Table | None:
+        if not self.directory:
+            return None
+        try:
+            with pa.memory_map(self._path(key)) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        remaining = float((table.schema.metadata or {}).get(_EXPIRES_AT, 0)) - time.time()
+        if remaining <= 0:
+            with self._lock:
+                self.expirations += 1
+            _unlink(self._path(key))
+            return None
+        table = table.replace_schema_metadata({k: v for k, v in table.schema.metadata.items() if k != _EXPIRES_AT})
+        self._insert(key, table, remaining)
+        return table
+
+    def _write(self, key: str, value: pa.Table, ttl: float) -> None:
+        if not self.directory:
+            return
+        metadata = {**(value.schema.metadata or {}), _EXPIRES_AT: str(time.time() + ttl).encode()}
+        table = value.replace_schema_metadata(metadata)
+        # Written under a private name and renamed, so readers never see a partial file.
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            _unlink(tmp)  # a full or read-only disk only costs the disk tier
+            return
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        # Oldest files go first once the directory is over its byte budget.
+        files = []
+        with os.scandir(self.directory) as entries:
+            for e in entries:
+                if e.name.endswith(".arrow"):
+                    stat = e.stat()
+                    files.append((stat.st_mtime, stat.st_size, e.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            _unlink(path)
+            total -= size
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,853 @@
+import math
+import re
+import threading
+from dataclasses import dataclass
+
+from query_cache import column_types, table_versions
+from spatial import cells_sql
+
+# -----------------------------
+# Trip rollup cubes
+# -----------------------------
+# One fact cube per city at hourly grain, keyed by
+# (year, month, dow, hour, payment_type, vendor). Each source year table has
+# its own cube partition table (rollup_trips_nyc_2019, ...), rebuilt only when
+# that source table changes, so a query over some years reads only theirs.
+# All taxi charts and KPIs re-aggregate these few thousand rows instead of
+# scanning the raw trip tables. Months appended by ingest.py are folded into
+# their partition on the next refresh instead of rebuilding it.
+
+
+@dataclass(frozen=True)
+class TripCube:
+    city: str
+    table: str
+    sources: dict[int, str]  # year -> raw trip table
+    pickup_ts: str
+    payment_type: str
+    payment_type_sql: str
+    vendor: str
+    vendor_sql: str
+    distance: str
+    revenue: str
+    tip: str
+    # Precomputed small-int calendar columns (see ingest.py normalize), used
+    # instead of EXTRACT() when the source table has them.
+    pickup_parts: dict[str, str] | None = None
+    # Name of a year's raw table when it isn't listed in `sources` (new years
+    # created by ingest.py).
+    table_pattern: str = ""
+
+
+NYC_CUBE = TripCube(
+    city="nyc",
+    table="rollup_trips_nyc",
+    sources={2019: "yellow_taxi_2019_1", 2023: "yellow_taxi_2023"},
+    pickup_ts="CAST(tpep_pickup_datetime AS TIMESTAMP)",
+    payment_type="payment_type",
+    payment_type_sql="SMALLINT",
+    vendor="VendorID",
+    vendor_sql="SMALLINT",
+    distance="trip_distance",
+    revenue="total_amount",
+    tip="tip_amount",
+    pickup_parts={"month": "pickup_month", "dow": "pickup_dow", "hour": "pickup_hour"},
+    table_pattern="yellow_taxi_{year}",
+)
+
+CHI_CUBE = TripCube(
+    city="chicago",
+    table="rollup_trips_chicago",
+    sources={2019: "chicago_taxi_2019", 2023: "chicago_taxi_2023"},
+    pickup_ts="trip_start_timestamp",
+    payment_type="payment_type",
+    payment_type_sql="VARCHAR",
+    vendor="company",
+    vendor_sql="VARCHAR",
+    distance="trip_miles",
+    revenue="trip_total",
+    tip="tips",
+    table_pattern="chicago_taxi_{year}",
+)
+
+CUBES = {c.city: c for c in (NYC_CUBE, CHI_CUBE)}
+
+CUBE_KEYS = ("year", "month", "dow", "hour", "payment_type", "vendor")
+CUBE_MEASURES = ("trips", "paid_trips", "paid_distance", "paid_revenue", "tipped_trips", "tip_ratio_sum")
+
+STATE_TABLE = "rollup_state"
+INGEST_LOG = "ingest_log"  # in the source database, written by ingest.py append
+
+# CTA station ranking: one row per station with its all-time total, so the
+# Top-N slider reads a ~150-row table instead of aggregating all ridership.
+CTA_SOURCE = "cta_l_ridership"
+STATION_INDEX = "rollup_cta_stations"
+
+# Chicago pickup density: trips per spatial.py grid cell for every level,
+# partitioned by year like the cubes (same source tables).
+PICKUP_CELLS = "rollup_chi_pickup_cells"
+PICKUP_LAT = "pickup_centroid_latitude"
+PICKUP_LON = "pickup_centroid_longitude"
+
+# NYC zone-pair counts: trips per (PULocationID, DOLocationID), one table per
+# year like the cubes. Pickup-zone, dropoff-zone and borough views join these
+# (at most 265 x 265 rows a year) to the zone dimension instead of raw trips.
+ZONE_COUNTS = "rollup_nyc_zones"
+# The zone dimension is the 265-row lookup, copied into each process's
+# in-memory catalog by load_zone_dim().
+ZONE_SOURCE = "NYC_zone_lookup"
+ZONE_DIM = "nyc_zone_dim"
+
+
+# Code dimensions: (code, label) tables for the cube's small-int keys, loaded
+# next to the zone dimension by load_code_dims(). Charts group on the codes and
+# join the labels onto their final few rows instead of building a label string
+# for every cube row.
+@dataclass(frozen=True)
+class CodeDim:
+    table: str
+    labels: dict[int, str]
+    other: str | None = None  # label shared by codes missing from `labels` (and NULL)
+
+    def code(self, column: str) -> str:
+        """Grouping expression for `column`: its code, or NULL for the codes `other` covers."""
+        if self.other is None:
+            return column
+        return f"IF({column} IN ({', '.join(str(c) for c in self.labels)}), {column}, NULL)"
+
+
+PAYMENT_TYPE_DIM = CodeDim(
+    "dim_nyc_payment_type",
+    {0: "Flex Fare", 1: "Credit Card", 2: "Cash", 3: "No Charge", 4: "Dispute", 5: "Unknown", 6: "Voided Trip"},
+    other="Other",
+)
+VENDOR_DIM = CodeDim(
+    "dim_nyc_vendor",
+    {1: "Creative Mobile Technologies", 2: "Curb Mobility", 6: "Myle Technologies", 7: "Helix"},
+    other="Other",
+)
+DAY_OF_WEEK_DIM = CodeDim(
+    "dim_day_of_week",
+    {0: "Sun", 1: "Mon", 2: "Tue", 3: "Wed", 4: "Thu", 5: "Fri", 6: "Sat"},  # dayofweek() numbering
+)
+CODE_DIMS = (PAYMENT_TYPE_DIM, VENDOR_DIM, DAY_OF_WEEK_DIM)
+
+# Chicago traffic speed: per-(date, hour) partial aggregates of each year's
+# sensor readings, one table per year like the cubes. Count, sum, min and max
+# all merge, so new readings fold straight in and the year, hour-of-day and
+# day-of-week views re-aggregate at most 8,784 rows a year.
+TRAFFIC_PATTERN = "chicago_traffic_{year}"
+TRAFFIC_ROLLUP = "rollup_chi_traffic"
+TRAFFIC_MEASURES = {"readings": "SUM", "speed_sum": "SUM", "speed_min": "MIN", "speed_max": "MAX"}
+
+# Preview samples: a stratified sample of each Chicago traffic year table,
+# about SAMPLE_PER_MONTH rows per calendar month, each row weighted by how many
+# source rows it stands for. Fast preview answers the traffic speed charts from
+# these (a few hundred thousand rows) while the exact queries run. Appends only
+# re-sample the months they added to.
+TRAFFIC_SAMPLE = "rollup_sample_chi_traffic"
+SAMPLE_PER_MONTH = 20_000
+
+_refresh_lock = threading.Lock()
+
+
+def partition_table(table: str, year: int) -> str:
+    """Name of one year's table of a per-year rollup (rollup_trips_nyc -> rollup_trips_nyc_2019)."""
+    return f"{table}_{year}"
+
+
+def cube_ddl(cube: TripCube, target: str, replace: bool = False) -> str:
+    create = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    return f"""
+    {create} {target} (
+        year SMALLINT,
+        month TINYINT,
+        dow TINYINT,
+        hour TINYINT,
+        payment_type {cube.payment_type_sql},
+        vendor {cube.vendor_sql},
+        trips BIGINT,
+        paid_trips BIGINT,
+        paid_distance DOUBLE,
+        paid_revenue DOUBLE,
+        tipped_trips BIGINT,
+        tip_ratio_sum DOUBLE
+    );
+    """
+
+
+def year_tables(sources: dict[int, str], table_pattern: str, tables) -> dict[int, str]:
+    """Year -> table among `tables`: the fixed `sources` plus any name matching table_pattern."""
+    found = {}
+    if table_pattern:
+        pattern = re.compile(re.escape(table_pattern).replace(r"\{year\}", r"(\d{4})") + "$")
+        for table in tables:
+            m = pattern.match(table)
+            if m:
+                found[int(m.group(1))] = table
+    present = set(tables)
+    found.update({year: table for year, table in sources.items() if table in present})
+    return dict(sorted(found.items()))
+
+
+def source_tables(cube: TripCube, tables) -> dict[int, str]:
+    return year_tables(cube.sources, cube.table_pattern, tables)
+
+
+def target_table(cube: TripCube, year: int) -> str:
+    """Raw table that holds (or will hold) `year`'s trips."""
+    return cube.sources.get(year) or cube.table_pattern.format(year=year)
+
+
+def partition_sql(cube: TripCube, year: int, relation: str, columns: set[str] | frozenset = frozenset()) -> str:
+    """SELECT producing one (city, year) partition of the cube from a raw trips relation."""
+    paid = f"{cube.distance} > 0 AND {cube.revenue} > 0"
+    tipped = f"{cube.tip} > 0 AND {cube.revenue} > 0"
+    if cube.pickup_parts and set(cube.pickup_parts.values()) <= columns:
+        calendar = ",\n            ".join(f"{col} AS {part}" for part, col in cube.pickup_parts.items())
+    else:
+        calendar = ",\n            ".join(
+            f"EXTRACT({part} FROM {cube.pickup_ts}) AS {part}" for part in ("month", "dow", "hour")
+        )
+    return f"""
+    WITH trips AS (
+        SELECT
+            {calendar},
+            TRY_CAST({cube.payment_type} AS {cube.payment_type_sql}) AS payment_type,
+            TRY_CAST({cube.vendor} AS {cube.vendor_sql}) AS vendor,
+            {cube.distance} AS distance,
+            {cube.revenue} AS revenue,
+            {cube.tip} AS tip,
+            {paid} AS is_paid,
+            {tipped} AS is_tipped
+        FROM {relation}
+    )
+    SELECT
+        {year} AS year,
+        month,
+        dow,
+        hour,
+        payment_type,
+        vendor,
+        COUNT(*) AS trips,
+        COUNT(*) FILTER (WHERE is_paid) AS paid_trips,
+        SUM(distance) FILTER (WHERE is_paid) AS paid_distance,
+        SUM(revenue) FILTER (WHERE is_paid) AS paid_revenue,
+        COUNT(*) FILTER (WHERE is_tipped) AS tipped_trips,
+        SUM(tip / revenue) FILTER (WHERE is_tipped) AS tip_ratio_sum
+    FROM trips
+    GROUP BY ALL
+    """
+
+
+def ensure_schema(conn, rollup_db: str) -> None:
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {rollup_db}.main.{STATE_TABLE} (
+        cube VARCHAR,
+        year SMALLINT,
+        source_table VARCHAR,
+        source_version VARCHAR,
+        built_at TIMESTAMP
+    );
+    """)
+    for table in table_versions(conn, rollup_db):
+        # Single-table cubes from before per-year partition tables.
+        if table in {cube.table for cube in CUBES.values()}:
+            conn.execute(f"DROP TABLE {rollup_db}.main.{table};")
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {rollup_db}.main.{STATION_INDEX} (
+        stationname VARCHAR,
+        total_rides BIGINT,
+        first_date DATE,
+        last_date DATE,
+        days BIGINT
+    );
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {rollup_db}.main.{PICKUP_CELLS} (
+        year SMALLINT,
+        level TINYINT,
+        cx INTEGER,
+        cy INTEGER,
+        trips BIGINT
+    );
+    """)
+
+
+def _built_versions(conn, rollup_db: str, max_age: float | None = None) -> dict[tuple[str, int], str]:
+    # Entries built more than max_age seconds ago count as unbuilt, for sources
+    # whose edits the version stamp can't see (see table_versions).
+    sql = f"SELECT cube, year, source_version FROM {rollup_db}.main.{STATE_TABLE}"
+    params = []
+    if max_age is not None:
+        sql += " WHERE built_at >= now()::TIMESTAMP - to_microseconds(?::BIGINT)"
+        params = [int(max_age * 1_000_000)]
+    return {(cube, year): version for cube, year, version in conn.execute(sql, params).fetchall()}
+
+
+def mark_built(conn, rollup_db: str, cube: str, year: int, source: str, version: str) -> None:
+    state = f"{rollup_db}.main.{STATE_TABLE}"
+    conn.execute(f"DELETE FROM {state} WHERE cube = ? AND year = ?;", [cube, year])
+    conn.execute(f"INSERT INTO {state} VALUES (?, ?, ?, ?, now()::TIMESTAMP);", [cube, year, source, version])
+
+
+def stale_partitions(conn, source_db: str, rollup_db: str,
+                     max_age: float | None = None) -> list[tuple[TripCube, int, str, str]]:
+    """(cube, year, source table, current version) for every partition that needs a rebuild."""
+    versions = table_versions(conn, source_db)
+    built = _built_versions(conn, rollup_db, max_age)
+    present = table_versions(conn, rollup_db)
+    stale = []
+    for cube in CUBES.values():
+        for year, source in source_tables(cube, versions).items():
+            if built.get((cube.table, year)) != versions[source] or partition_table(cube.table, year) not in present:
+                stale.append((cube, year, source, versions[source]))
+    return stale
+
+
+def rebuild_partition(conn, cube: TripCube, year: int, source: str, version: str, source_db: str,
+                      rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{partition_table(cube.table, year)}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(cube_ddl(cube, target, replace=True))
+        columns = set(column_types(conn, source_db, source))
+        conn.execute(f"INSERT INTO {target} BY NAME {partition_sql(cube, year, f'{source_db}.main.{source}', columns)};")
+        mark_built(conn, rollup_db, cube.table, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def rebuild_station_index(conn, version: str, source_db: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{STATION_INDEX}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(f"DELETE FROM {target};")
+        conn.execute(f"""
+        INSERT INTO {target} BY NAME
+        SELECT
+            stationname,
+            SUM(rides)::BIGINT AS total_rides,
+            MIN(date)::DATE AS first_date,
+            MAX(date)::DATE AS last_date,
+            COUNT(*) AS days
+        FROM {source_db}.main.{CTA_SOURCE}
+        GROUP BY stationname;
+        """)
+        mark_built(conn, rollup_db, STATION_INDEX, 0, CTA_SOURCE, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def station_index_stale(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> str | None:
+    """Current ridership version if the ranking must be rebuilt, else None."""
+    current = table_versions(conn, source_db).get(CTA_SOURCE)
+    if current is None or _built_versions(conn, rollup_db, max_age).get((STATION_INDEX, 0)) == current:
+        return None
+    return current
+
+
+def stale_cells(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> list[tuple[int, str, str]]:
+    """(year, source table, current version) for every pickup-cell partition that needs a rebuild."""
+    versions = table_versions(conn, source_db)
+    built = _built_versions(conn, rollup_db, max_age)
+    return [
+        (year, source, versions[source])
+        for year, source in source_tables(CHI_CUBE, versions).items()
+        if built.get((PICKUP_CELLS, year)) != versions[source]
+    ]
+
+
+def rebuild_cells(conn, year: int, source: str, version: str, source_db: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{PICKUP_CELLS}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(f"DELETE FROM {target} WHERE year = ?;", [year])
+        cells = cells_sql(f"{source_db}.main.{source}", PICKUP_LAT, PICKUP_LON, year)
+        conn.execute(f"INSERT INTO {target} BY NAME {cells};")
+        mark_built(conn, rollup_db, PICKUP_CELLS, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def zones_ddl(target: str, replace: bool = False) -> str:
+    create = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    return f"""
+    {create} {target} (
+        year SMALLINT,
+        PULocationID SMALLINT,
+        DOLocationID SMALLINT,
+        trips BIGINT
+    );
+    """
+
+
+def zones_sql(relation: str, year: int) -> str:
+    return f"""
+    SELECT
+        {year} AS year,
+        TRY_CAST(PULocationID AS SMALLINT) AS PULocationID,
+        TRY_CAST(DOLocationID AS SMALLINT) AS DOLocationID,
+        COUNT(*) AS trips
+    FROM {relation}
+    GROUP BY ALL
+    """
+
+
+def stale_zones(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> list[tuple[int, str, str]]:
+    """(year, source table, current version) for every zone-count partition that needs a rebuild."""
+    versions = table_versions(conn, source_db)
+    built = _built_versions(conn, rollup_db, max_age)
+    present = table_versions(conn, rollup_db)
+    return [
+        (year, source, versions[source])
+        for year, source in source_tables(NYC_CUBE, versions).items()
+        if built.get((ZONE_COUNTS, year)) != versions[source] or partition_table(ZONE_COUNTS, year) not in present
+    ]
+
+
+def rebuild_zones(conn, year: int, source: str, version: str, source_db: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{partition_table(ZONE_COUNTS, year)}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(zones_ddl(target, replace=True))
+        conn.execute(f"INSERT INTO {target} BY NAME {zones_sql(f'{source_db}.main.{source}', year)};")
+        mark_built(conn, rollup_db, ZONE_COUNTS, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def traffic_ddl(target: str, replace: bool = False) -> str:
+    create = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    return f"""
+    {create} {target} (
+        year SMALLINT,
+        date DATE,
+        hour TINYINT,
+        readings BIGINT,
+        speed_sum DOUBLE,
+        speed_min DOUBLE,
+        speed_max DOUBLE
+    );
+    """
+
+
+def traffic_sql(relation: str, year: int) -> str:
+    return f"""
+    SELECT
+        {year} AS year,
+        time::DATE AS date,
+        hour(time) AS hour,
+        COUNT(speed) AS readings,
+        SUM(speed) AS speed_sum,
+        MIN(speed) AS speed_min,
+        MAX(speed) AS speed_max
+    FROM {relation}
+    GROUP BY ALL
+    """
+
+
+def stale_traffic(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> list[tuple[int, str, str]]:
+    """(year, source table, current version) for every traffic rollup partition that needs a rebuild."""
+    versions = table_versions(conn, source_db)
+    built = _built_versions(conn, rollup_db, max_age)
+    present = table_versions(conn, rollup_db)
+    return [
+        (year, source, versions[source])
+        for year, source in year_tables({}, TRAFFIC_PATTERN, versions).items()
+        if built.get((TRAFFIC_ROLLUP, year)) != versions[source] or partition_table(TRAFFIC_ROLLUP, year) not in present
+    ]
+
+
+def rebuild_traffic(conn, year: int, source: str, version: str, source_db: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{partition_table(TRAFFIC_ROLLUP, year)}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        conn.execute(traffic_ddl(target, replace=True))
+        conn.execute(f"INSERT INTO {target} BY NAME {traffic_sql(f'{source_db}.main.{source}', year)};")
+        mark_built(conn, rollup_db, TRAFFIC_ROLLUP, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def sample_sql(relation: str, year: int, per_month: int = SAMPLE_PER_MONTH) -> str:
+    """Hash-selected rows of each month, about per_month of them, with weight = month rows / kept rows.
+
+    Two streaming passes (month counts, then the filter); no sort over the table.
+    """
+    return f"""
+    WITH months AS (
+        SELECT month(time) AS month, COUNT(*) AS month_rows
+        FROM {relation}
+        GROUP BY 1
+    ),
+    kept AS (
+        SELECT m.month, t.time, t.speed, m.month_rows
+        FROM {relation} t
+        JOIN months m ON month(t.time) = m.month
+        WHERE hash(t.time, t.speed) % 1000000 < 1000000.0 * {per_month} / m.month_rows
+    )
+    SELECT
+        {year} AS year,
+        month,
+        time,
+        speed,
+        month_rows / COUNT(*) OVER (PARTITION BY month) AS weight
+    FROM kept
+    """
+
+
+def stale_samples(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> list[tuple[int, str, str]]:
+    """(year, source table, current version) for every traffic sample that needs a rebuild."""
+    versions = table_versions(conn, source_db)
+    built = _built_versions(conn, rollup_db, max_age)
+    present = table_versions(conn, rollup_db)
+    return [
+        (year, source, versions[source])
+        for year, source in year_tables({}, TRAFFIC_PATTERN, versions).items()
+        if built.get((TRAFFIC_SAMPLE, year)) != versions[source] or partition_table(TRAFFIC_SAMPLE, year) not in present
+    ]
+
+
+def rebuild_sample(conn, year: int, source: str, version: str, source_db: str, rollup_db: str,
+                   months: list[int] | None = None) -> None:
+    """Re-sample a year's traffic table, or only `months` of it (each month is sampled on its own)."""
+    target = f"{rollup_db}.main.{partition_table(TRAFFIC_SAMPLE, year)}"
+    relation = f"{source_db}.main.{source}"
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        if months is None:
+            conn.execute(f"CREATE OR REPLACE TABLE {target} AS {sample_sql(relation, year)};")
+        else:
+            in_months = ", ".join(str(int(m)) for m in months)
+            conn.execute(f"DELETE FROM {target} WHERE month IN ({in_months});")
+            relation = f"(SELECT * FROM {relation} WHERE month(time) IN ({in_months}))"
+            conn.execute(f"INSERT INTO {target} BY NAME {sample_sql(relation, year)};")
+        mark_built(conn, rollup_db, TRAFFIC_SAMPLE, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def load_zone_dim(conn, source_db: str, dim_db: str = "memory") -> None:
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE {dim_db}.main.{ZONE_DIM} AS
+    SELECT LocationID::SMALLINT AS LocationID, Zone, Borough, service_zone
+    FROM {source_db}.main.{ZONE_SOURCE};
+    """)
+
+
+def load_code_dims(conn, dim_db: str = "memory") -> None:
+    for dim in CODE_DIMS:
+        conn.execute(f"CREATE OR REPLACE TABLE {dim_db}.main.{dim.table} (code SMALLINT PRIMARY KEY, label VARCHAR);")
+        conn.executemany(f"INSERT INTO {dim_db}.main.{dim.table} VALUES (?, ?);", list(dim.labels.items()))
+
+
+# -----------------------------
+# Incremental folding (new rows only)
+# -----------------------------
+# Every rollup measure is a sum (or a min/max), so the rollup rows of a batch
+# of new rows can simply be added to the partition and the touched keys re-merged.
+# ingest.py append logs each file's first rowid and the table's version before
+# and after it in the source database's ingest log. When a stale partition's
+# built version leads to the current one through those entries alone, refresh
+# folds just the rows from that rowid on (a rowid filter skips the older row
+# groups); any other change to the table breaks the chain and rebuilds it.
+
+
+def appended_since(conn, source_db: str, source: str, year: int, built: str | None,
+                   version: str) -> tuple[str, list[int]] | None:
+    """(relation over the rows appended since `built`, their months), or None if `source` changed otherwise."""
+    if built is None or "version_after" not in column_types(conn, source_db, INGEST_LOG):
+        return None
+    entries = conn.execute(
+        f"SELECT first_row, month, version_before, version_after FROM {source_db}.main.{INGEST_LOG} "
+        "WHERE target = ? AND year = ? AND version_after IS NOT NULL ORDER BY ingested_at",
+        [source, year],
+    ).fetchall()
+    first, months, at = None, set(), built
+    for first_row, month, before, after in entries:
+        if before == at:
+            first = first_row if first is None else first
+            months.add(month)
+            at = after
+    if first is None or at != version:
+        return None
+    return f"(SELECT * FROM {source_db}.main.{source} WHERE rowid >= {int(first)})", sorted(months)
+
+
+def fold_appended(conn, fold, rollup_db: str, cube: str, year: int, source: str, version: str) -> None:
+    """Run `fold()` and stamp the (cube, year) rollup with `version` in one transaction."""
+    conn.execute("BEGIN TRANSACTION;")
+    try:
+        fold()
+        mark_built(conn, rollup_db, cube, year, source, version)
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def fold_into_cube(conn, cube: TripCube, year: int, relation: str, columns: set[str], rollup_db: str,
+                   months: list[int]) -> None:
+    target = f"{rollup_db}.main.{partition_table(cube.table, year)}"
+    conn.execute(cube_ddl(cube, target))
+    conn.execute(f"INSERT INTO {target} BY NAME {partition_sql(cube, year, relation, columns)};")
+    _merge_duplicates(conn, target, CUBE_KEYS, CUBE_MEASURES,
+                      f"month IN ({', '.join(str(int(m)) for m in months)})")
+
+
+def fold_into_zones(conn, year: int, relation: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{partition_table(ZONE_COUNTS, year)}"
+    conn.execute(zones_ddl(target))
+    conn.execute(f"INSERT INTO {target} BY NAME {zones_sql(relation, year)};")
+    _merge_duplicates(conn, target, ("year", "PULocationID", "DOLocationID"), ("trips",), "true")
+
+
+def fold_into_cells(conn, year: int, relation: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{PICKUP_CELLS}"
+    conn.execute(f"INSERT INTO {target} BY NAME {cells_sql(relation, PICKUP_LAT, PICKUP_LON, year)};")
+    _merge_duplicates(conn, target, ("year", "level", "cx", "cy"), ("trips",), f"year = {int(year)}")
+
+
+def fold_into_traffic(conn, year: int, relation: str, rollup_db: str) -> None:
+    target = f"{rollup_db}.main.{partition_table(TRAFFIC_ROLLUP, year)}"
+    conn.execute(traffic_ddl(target))
+    conn.execute(f"INSERT INTO {target} BY NAME {traffic_sql(relation, year)};")
+    _merge_duplicates(conn, target, ("year", "date", "hour"), TRAFFIC_MEASURES, "true")
+
+
+def _merge_duplicates(conn, target: str, keys: tuple[str, ...], measures: tuple[str, ...] | dict[str, str],
+                      where: str) -> None:
+    """Collapse rows sharing `keys` (within `where`); measures are summed unless mapped to another aggregate."""
+    merges = measures if isinstance(measures, dict) else dict.fromkeys(measures, "SUM")
+    aggregates = ", ".join(f"{agg}({m}) AS {m}" for m, agg in merges.items())
+    conn.execute(f"""
+    CREATE OR REPLACE TEMP TABLE _rollup_merge AS
+    SELECT {', '.join(keys)}, {aggregates} FROM {target} WHERE {where} GROUP BY ALL;
+    """)
+    conn.execute(f"DELETE FROM {target} WHERE {where};")
+    conn.execute(f"INSERT INTO {target} BY NAME SELECT * FROM _rollup_merge;")
+    conn.execute("DROP TABLE _rollup_merge;")
+
+
+def refresh_rollups(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> list[tuple[str, int]]:
+    """Create the cubes if needed and refresh only partitions whose source changed.
+
+    Partitions whose source only had logged appends since they were built get
+    those rows folded in; the rest are rebuilt. With `max_age` (seconds),
+    partitions built longer ago than that are rebuilt too.
+    """
+    with _refresh_lock:
+        ensure_schema(conn, rollup_db)
+        built = _built_versions(conn, rollup_db, max_age)
+        present = table_versions(conn, rollup_db)
+        refreshed = []
+        for cube, year, source, version in stale_partitions(conn, source_db, rollup_db, max_age):
+            appended = appended_since(conn, source_db, source, year, built.get((cube.table, year)), version)
+            if appended and partition_table(cube.table, year) in present:
+                relation, months = appended
+                columns = set(column_types(conn, source_db, source))
+                fold_appended(conn, lambda: fold_into_cube(conn, cube, year, relation, columns, rollup_db, months),
+                              rollup_db, cube.table, year, source, version)
+            else:
+                rebuild_partition(conn, cube, year, source, version, source_db, rollup_db)
+            refreshed.append((cube.city, year))
+        version = station_index_stale(conn, source_db, rollup_db, max_age)
+        if version is not None:
+            rebuild_station_index(conn, version, source_db, rollup_db)
+            refreshed.append(("cta", 0))
+        for year, source, version in stale_cells(conn, source_db, rollup_db, max_age):
+            appended = appended_since(conn, source_db, source, year, built.get((PICKUP_CELLS, year)), version)
+            if appended:
+                relation, _ = appended
+                fold_appended(conn, lambda: fold_into_cells(conn, year, relation, rollup_db),
+                              rollup_db, PICKUP_CELLS, year, source, version)
+            else:
+                rebuild_cells(conn, year, source, version, source_db, rollup_db)
+            refreshed.append(("chicago_cells", year))
+        for year, source, version in stale_zones(conn, source_db, rollup_db, max_age):
+            appended = appended_since(conn, source_db, source, year, built.get((ZONE_COUNTS, year)), version)
+            if appended and partition_table(ZONE_COUNTS, year) in present:
+                relation, _ = appended
+                fold_appended(conn, lambda: fold_into_zones(conn, year, relation, rollup_db),
+                              rollup_db, ZONE_COUNTS, year, source, version)
+            else:
+                rebuild_zones(conn, year, source, version, source_db, rollup_db)
+            refreshed.append(("nyc_zones", year))
+        for year, source, version in stale_traffic(conn, source_db, rollup_db, max_age):
+            appended = appended_since(conn, source_db, source, year, built.get((TRAFFIC_ROLLUP, year)), version)
+            if appended and partition_table(TRAFFIC_ROLLUP, year) in present:
+                relation, _ = appended
+                fold_appended(conn, lambda: fold_into_traffic(conn, year, relation, rollup_db),
+                              rollup_db, TRAFFIC_ROLLUP, year, source, version)
+            else:
+                rebuild_traffic(conn, year, source, version, source_db, rollup_db)
+            refreshed.append(("chi_traffic", year))
+        for year, source, version in stale_samples(conn, source_db, rollup_db, max_age):
+            appended = appended_since(conn, source_db, source, year, built.get((TRAFFIC_SAMPLE, year)), version)
+            months = appended[1] if appended and partition_table(TRAFFIC_SAMPLE, year) in present else None
+            rebuild_sample(conn, year, source, version, source_db, rollup_db, months)
+            refreshed.append(("traffic_sample", year))
+        return refreshed
+
+
+# -----------------------------
+# Preview rollups (opt-in, while the exact ones are first built)
+# -----------------------------
+# A cold build scans every raw row. With preview on, the same rollups are first
+# built from a per-month reservoir sample of each trip and traffic year table
+# (about target_rows rows each, split across months in proportion to their
+# size) into their own catalog. Each month's counts are then scaled back up by
+# its rows / sampled rows, so monthly totals come out exact and every dashboard
+# query runs unchanged against them; ratios (average fare, tip %, speed) need
+# no scaling. The cube partitions keep that weight as `sample_weight`, from
+# which the preview queries in queries.py draw each count's 95% interval.
+PREVIEW_SOURCE = "preview_source"  # the sampled year tables, plus views over the small ones
+PREVIEW_DB = "preview"
+PREVIEW_SEED = 42  # fixed, so a rebuild draws the same rows
+
+
+def table_rows(conn, database: str, table: str) -> int:
+    row = conn.execute(
+        "SELECT estimated_size FROM duckdb_tables() WHERE database_name = ? AND schema_name = 'main' AND table_name = ?",
+        [database, table],
+    ).fetchone()
+    if row is None:
+        # A view (Parquet backend), whose count comes from file metadata.
+        row = conn.execute(f"SELECT count(*) FROM {database}.main.{table}").fetchone()
+    return int(row[0])
+
+
+def rollups_stale(conn, source_db: str, rollup_db: str, max_age: float | None = None) -> bool:
+    """Whether refresh_rollups has anything to build (always, on a first start)."""
+    if STATE_TABLE not in table_versions(conn, rollup_db):
+        return True
+    return bool(stale_partitions(conn, source_db, rollup_db, max_age)
+                or station_index_stale(conn, source_db, rollup_db, max_age)
+                or stale_cells(conn, source_db, rollup_db, max_age)
+                or stale_zones(conn, source_db, rollup_db, max_age)
+                or stale_traffic(conn, source_db, rollup_db, max_age)
+                or stale_samples(conn, source_db, rollup_db, max_age))
+
+
+def sample_month(conn, source_db: str, table: str) -> str:
+    """The month-of-year expression a year table is stratified by (the cube's `month` key)."""
+    for cube in CUBES.values():
+        if table in source_tables(cube, [table]).values():
+            if cube.pickup_parts and cube.pickup_parts["month"] in column_types(conn, source_db, table):
+                return cube.pickup_parts["month"]
+            return f"EXTRACT(month FROM {cube.pickup_ts})"
+    return "month(time)"  # traffic
+
+
+def reservoir_sample(conn, source_db: str, table: str, fraction: float, target: str) -> dict[int, float]:
+    """Materialize a per-month sample of `table` into `target`; returns month -> rows per sampled row.
+
+    Each month keeps ceil(fraction * its rows) rows: a Bernoulli pass at a rate
+    with headroom for every month draws candidates, and the first k of each
+    month by a seeded hash are kept. That is two streaming scans and a sort of
+    the candidates only, against a sort of the whole table for a plain
+    per-month row_number().
+    """
+    month = f"COALESCE({sample_month(conn, source_db, table)}, 0)"
+    relation = f"{source_db}.main.{table}"
+    counts = dict(conn.execute(f"SELECT {month}, count(*) FROM {relation} GROUP BY 1").fetchall())
+    keep = {m: math.ceil(fraction * n) for m, n in counts.items()}
+    rate = min(1.0, max((keep[m] + 5 * math.sqrt(keep[m]) + 10) / n for m, n in counts.items()))
+    limits = " ".join(f"WHEN {int(m)} THEN {k}" for m, k in keep.items())
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE {target} AS
+    SELECT * EXCLUDE (_month)
+    FROM (
+        SELECT *, {month} AS _month
+        FROM {relation} USING SAMPLE {rate * 100:.6f} PERCENT (bernoulli, {PREVIEW_SEED})
+    ) c
+    QUALIFY row_number() OVER (PARTITION BY _month ORDER BY hash(c, {PREVIEW_SEED})) <= CASE _month {limits} END;
+    """)
+    kept = dict(conn.execute(f"SELECT {month}, count(*) FROM {target} GROUP BY 1").fetchall())
+    return {m: counts[m] / kept[m] for m in kept}
+
+
+def _as_double(conn, target: str, measures: tuple[str, ...]) -> None:
+    # A scaled-up count is fractional; rounding every small cell back to an
+    # integer would bias the totals.
+    for m in measures:
+        conn.execute(f"ALTER TABLE {target} ALTER {m} TYPE DOUBLE;")
+
+
+def _scale(conn, target: str, measures: tuple[str, ...], fraction: float, where: str = "true") -> None:
+    if fraction < 1:
+        _as_double(conn, target, measures)
+        sets = ", ".join(f"{m} = {m} / {fraction!r}" for m in measures)
+        conn.execute(f"UPDATE {target} SET {sets} WHERE {where};")
+
+
+def _reweight(conn, target: str, measures: tuple[str, ...], weights: dict[int, float]) -> None:
+    # Per-month scale-up, recorded in sample_weight for the interval estimates.
+    conn.execute(f"ALTER TABLE {target} ADD COLUMN IF NOT EXISTS sample_weight DOUBLE DEFAULT 1;")
+    if not weights:
+        return
+    _as_double(conn, target, measures)
+    rows = ", ".join(f"({int(m)}, {w!r})" for m, w in weights.items())
+    sets = ", ".join(f"{m} = {m} * w.weight" for m in (*measures, "sample_weight"))
+    conn.execute(f"UPDATE {target} SET {sets} FROM (VALUES {rows}) w(month, weight) "
+                 f"WHERE COALESCE({target}.month, 0) = w.month;")
+
+
+def build_preview(conn, source_db: str, target_rows: int, preview_db: str = PREVIEW_DB) -> dict:
+    """Build every rollup from sampled year tables into a fresh `preview_db`.
+
+    Returns each year table's sample fraction.
+    """
+    conn.execute(f"DETACH DATABASE IF EXISTS {preview_db};")
+    conn.execute(f"ATTACH ':memory:' AS {preview_db};")
+    conn.execute(f"ATTACH IF NOT EXISTS ':memory:' AS {PREVIEW_SOURCE};")
+    versions = table_versions(conn, source_db)
+    fractions = {
+        table: min(1.0, target_rows / max(table_rows(conn, source_db, table), 1))
+        for tables in (source_tables(NYC_CUBE, versions), source_tables(CHI_CUBE, versions),
+                       year_tables({}, TRAFFIC_PATTERN, versions))
+        for table in tables.values()
+    }
+    weights = {}
+    for table in [*fractions, *([CTA_SOURCE] if CTA_SOURCE in versions else [])]:
+        target = f"{PREVIEW_SOURCE}.main.{table}"
+        if fractions.get(table, 1.0) < 1:
+            weights[table] = reservoir_sample(conn, source_db, table, fractions[table], target)
+        else:
+            conn.execute(f"CREATE OR REPLACE VIEW {target} AS SELECT * FROM {source_db}.main.{table};")
+    refresh_rollups(conn, PREVIEW_SOURCE, preview_db)
+
+    def overall(table: str) -> float:
+        # Sampled share of the whole table, for rollups without a month key.
+        if table not in weights:
+            return 1.0
+        return table_rows(conn, PREVIEW_SOURCE, table) / table_rows(conn, source_db, table)
+
+    for cube in CUBES.values():
+        for year, table in source_tables(cube, versions).items():
+            target = f"{preview_db}.main.{partition_table(cube.table, year)}"
+            _reweight(conn, target, CUBE_MEASURES, weights.get(table, {}))
+    for year, table in source_tables(NYC_CUBE, versions).items():
+        _scale(conn, f"{preview_db}.main.{partition_table(ZONE_COUNTS, year)}", ("trips",), overall(table))
+    for year, table in source_tables(CHI_CUBE, versions).items():
+        _scale(conn, f"{preview_db}.main.{PICKUP_CELLS}", ("trips",), overall(table), f"year = {int(year)}")
+    return {"fractions": fractions}
+
+
+def drop_preview(conn, preview_db: str = PREVIEW_DB) -> None:
+    """Free the preview catalog and its samples once the exact rollups are served."""
+    conn.execute(f"DETACH DATABASE IF EXISTS {preview_db};")
+    conn.execute(f"DETACH DATABASE IF EXISTS {PREVIEW_SOURCE};")
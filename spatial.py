@@ -0,0 +1,73 @@
+import math
+
+# -----------------------------
+# Hierarchical pickup grid
+# -----------------------------
+# A geohash-style quadtree over lon/lat: at level L the world is split into
+# 2^L x 2^L cells and a cell's parent at level L-k is (cx >> k, cy >> k), so
+# every coarser level is a cheap roll-up of the finest one. Maps pick the
+# finest level whose cell count fits a budget and draw one weighted dot per
+# cell instead of thousands of near-duplicate points.
+
+MIN_LEVEL = 10  # ~30 km cells
+MAX_LEVEL = 20  # ~30 m cells
+EARTH_M_PER_DEG = 111_320
+CHICAGO_LAT = 41.88
+
+
+def cell_x(lon: str, level: int) -> str:
+    return f"floor(({lon} + 180.0) / 360.0 * {1 << level})::INTEGER"
+
+
+def cell_y(lat: str, level: int) -> str:
+    return f"floor(({lat} + 90.0) / 180.0 * {1 << level})::INTEGER"
+
+
+def center_lon(cx: str, level: int) -> str:
+    return f"(({cx} + 0.5) * 360.0 / {1 << level} - 180.0)"
+
+
+def center_lat(cy: str, level: int) -> str:
+    return f"(({cy} + 0.5) * 180.0 / {1 << level} - 90.0)"
+
+
+def cell_height_m(level: int) -> float:
+    return 180.0 / (1 << level) * EARTH_M_PER_DEG
+
+
+def cell_width_m(level: int, lat: float) -> float:
+    return 360.0 / (1 << level) * EARTH_M_PER_DEG * math.cos(math.radians(lat))
+
+
+def dot_radius_m(level: int, lat: float = CHICAGO_LAT) -> float:
+    """Radius of the busiest cell's dot: half the cell's shorter side."""
+    return min(cell_height_m(level), cell_width_m(level, lat)) / 2
+
+
+def cells_sql(source: str, lat: str, lon: str, year: int) -> str:
+    """Trip counts per (level, cx, cy) for every level, rolled up from the finest."""
+    return f"""
+    WITH finest AS (
+        SELECT
+            {cell_x(lon, MAX_LEVEL)} AS cx,
+            {cell_y(lat, MAX_LEVEL)} AS cy,
+            COUNT(*) AS trips
+        FROM {source}
+        WHERE {lat} IS NOT NULL AND {lon} IS NOT NULL
+        GROUP BY ALL
+    )
+    SELECT
+        {year} AS year,
+        level,
+        cx >> ({MAX_LEVEL} - level) AS cx,
+        cy >> ({MAX_LEVEL} - level) AS cy,
+        SUM(trips)::BIGINT AS trips
+    FROM finest, (SELECT range::TINYINT AS level FROM range({MIN_LEVEL}, {MAX_LEVEL + 1}))
+    GROUP BY ALL
+    """
+
+
+def choose_level(cell_counts: dict[int, int], max_cells: int) -> int:
+    """Finest level whose cell count is within max_cells (coarsest level if none is)."""
+    fitting = [level for level, cells in cell_counts.items() if cells <= max_cells]
+    return max(fitting) if fitting else MIN_LEVEL
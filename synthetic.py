@@ -0,0 +1,183 @@
+import argparse
+import time
+
+import duckdb
+
+# -----------------------------
+# Synthetic data generator
+# -----------------------------
+# Builds a local DuckDB with the same tables and columns the dashboard reads
+# from MotherDuck, at a configurable number of rows per trip/traffic table.
+# Values come from hash() of the row number, so a given scale always produces
+# the same data regardless of thread count.
+
+SCALES = {"1M": 1_000_000, "10M": 10_000_000, "100M": 100_000_000}
+
+YEARS = (2019, 2023)
+CTA_STATIONS = 145
+CTA_FIRST_DAY = "2001-01-01"
+CTA_LAST_DAY = "2023-12-31"
+BOROUGHS = ["Manhattan", "Queens", "Brooklyn", "Bronx", "Staten Island", "EWR"]
+CHICAGO_PAYMENTS = ["Credit Card", "Cash", "Mobile", "Prcard", "Unknown", "No Charge", "Dispute"]
+
+
+def parse_scale(scale: str) -> int:
+    scale = scale.strip().upper()
+    if scale in SCALES:
+        return SCALES[scale]
+    if scale.endswith("K"):
+        return int(float(scale[:-1]) * 1_000)
+    if scale.endswith("M"):
+        return int(float(scale[:-1]) * 1_000_000)
+    return int(scale)
+
+
+def _macros(conn) -> None:
+    # u(i, salt): uniform [0, 1) from the row number; pick(i, salt, n): 0..n-1.
+    conn.execute("CREATE OR REPLACE TEMP MACRO u(i, salt) AS (hash(i, salt) % 1000003) / 1000003.0;")
+    conn.execute("CREATE OR REPLACE TEMP MACRO pick(i, salt, n) AS (hash(i, salt) % n)::INTEGER;")
+    # Pickup instant within `year`, weighted towards daytime hours.
+    conn.execute("""
+    CREATE OR REPLACE TEMP MACRO pickup_ts(i, year) AS
+        make_timestamp(year, 1, 1, 0, 0, 0)
+        + INTERVAL (pick(i, 11, CASE WHEN year % 4 = 0 THEN 366 ELSE 365 END)) DAY
+        + INTERVAL (floor(24 * pow(u(i, 12), 0.8))::INTEGER) HOUR
+        + INTERVAL (pick(i, 13, 3600)) SECOND;
+    """)
+
+
+def yellow_taxi(conn, table: str, year: int, rows: int) -> None:
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE {table} AS
+    WITH r AS (SELECT range AS i, pickup_ts(range, {year}) AS ts FROM range({rows}))
+    SELECT
+        [1, 2, 2, 1, 6, 7][pick(i, 1, 6) + 1]::BIGINT AS VendorID,
+        strftime(ts, '%Y-%m-%d %H:%M:%S') AS tpep_pickup_datetime,
+        strftime(ts + INTERVAL (60 + pick(i, 2, 3000)) SECOND, '%Y-%m-%d %H:%M:%S') AS tpep_dropoff_datetime,
+        (1 + pick(i, 3, 4))::DOUBLE AS passenger_count,
+        round(30 * pow(u(i, 4), 3), 2) AS trip_distance,
+        1::DOUBLE AS RatecodeID,
+        'N' AS store_and_fwd_flag,
+        (1 + floor(265 * pow(u(i, 5), 2)))::BIGINT AS PULocationID,
+        (1 + floor(265 * pow(u(i, 6), 2)))::BIGINT AS DOLocationID,
+        [1, 1, 1, 1, 1, 1, 1, 2, 2, 2, 3, 4, 0, 5][pick(i, 7, 14) + 1]::BIGINT AS payment_type,
+        round(3 + 60 * pow(u(i, 8), 2), 2) AS fare_amount,
+        round(CASE WHEN u(i, 9) < 0.7 THEN 12 * pow(u(i, 10), 2) ELSE 0 END, 2) AS tip_amount,
+        0.0 AS tolls_amount,
+        round(fare_amount + tip_amount + 2.5 - CASE WHEN u(i, 14) < 0.01 THEN 80 ELSE 0 END, 2) AS total_amount,
+        2.5 AS congestion_surcharge
+    FROM r;
+    """)
+
+
+def chicago_taxi(conn, table: str, year: int, rows: int) -> None:
+    payments = ", ".join(f"'{p}'" for p in CHICAGO_PAYMENTS)
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE {table} AS
+    WITH r AS (SELECT range AS i, pickup_ts(range, {year}) AS ts FROM range({rows}))
+    SELECT
+        md5(i::VARCHAR || '{table}') AS trip_id,
+        md5(pick(i, 1, 6000)::VARCHAR) AS taxi_id,
+        ts AS trip_start_timestamp,
+        ts + INTERVAL (60 + pick(i, 2, 3000)) SECOND AS trip_end_timestamp,
+        (60 + pick(i, 2, 3000))::BIGINT AS trip_seconds,
+        round(25 * pow(u(i, 4), 3), 2) AS trip_miles,
+        (1 + pick(i, 5, 77))::BIGINT AS pickup_community_area,
+        (1 + pick(i, 6, 77))::BIGINT AS dropoff_community_area,
+        round(3.25 + 50 * pow(u(i, 8), 2), 2) AS fare,
+        round(CASE WHEN u(i, 9) < 0.5 THEN 10 * pow(u(i, 10), 2) ELSE 0 END, 2) AS tips,
+        0.0 AS tolls,
+        round(2 * u(i, 15), 2) AS extras,
+        round(fare + tips + extras, 2) AS trip_total,
+        [{payments}][least(pick(i, 7, 10), {len(CHICAGO_PAYMENTS) - 1}) + 1] AS payment_type,
+        'Company ' || lpad(pick(i, 16, 40)::VARCHAR, 2, '0') AS company,
+        CASE WHEN u(i, 17) < 0.05 THEN NULL
+             ELSE round(41.88 + 0.12 * ((u(i, 18) + u(i, 19) + u(i, 20)) / 1.5 - 1), 9) END AS pickup_centroid_latitude,
+        CASE WHEN u(i, 17) < 0.05 THEN NULL
+             ELSE round(-87.63 + 0.15 * ((u(i, 21) + u(i, 22) + u(i, 23)) / 1.5 - 1), 9) END AS pickup_centroid_longitude
+    FROM r;
+    """)
+
+
+def chicago_traffic(conn, table: str, year: int, rows: int) -> None:
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE {table} AS
+    WITH r AS (SELECT range AS i, pickup_ts(range, {year}) AS ts FROM range({rows}))
+    SELECT
+        date_trunc('minute', ts) AS time,
+        (1 + pick(i, 1, 1300))::BIGINT AS segment_id,
+        round(greatest(0, 28 - 10 * (hour(ts) BETWEEN 7 AND 9 OR hour(ts) BETWEEN 16 AND 18)::INTEGER
+                          + 12 * (u(i, 2) - 0.5)), 1) AS speed,
+        pick(i, 3, 20)::BIGINT AS bus_count,
+        pick(i, 4, 80)::BIGINT AS message_count
+    FROM r;
+    """)
+
+
+def cta_ridership(conn) -> None:
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE cta_l_ridership AS
+    WITH days AS (SELECT unnest(range(DATE '{CTA_FIRST_DAY}', DATE '{CTA_LAST_DAY}' + 1, INTERVAL 1 DAY))::DATE AS date),
+    stations AS (SELECT range AS s FROM range({CTA_STATIONS}))
+    SELECT
+        (40000 + s * 10)::BIGINT AS station_id,
+        'Station ' || lpad(s::VARCHAR, 3, '0') AS stationname,
+        date,
+        CASE WHEN dayofweek(date) = 6 THEN 'A' WHEN dayofweek(date) = 0 THEN 'U' ELSE 'W' END AS daytype,
+        (20000 * pow((s + 1) / {CTA_STATIONS}.0, -0.8) / 40
+            * CASE WHEN dayofweek(date) IN (0, 6) THEN 0.5 ELSE 1 END
+            * (0.8 + 0.4 * u(hash(s, date), 1)))::BIGINT AS rides
+    FROM stations, days;
+    """)
+
+
+def zone_lookup(conn) -> None:
+    boroughs = ", ".join(f"'{b}'" for b in BOROUGHS)
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE NYC_zone_lookup AS
+    SELECT
+        (range + 1)::BIGINT AS LocationID,
+        [{boroughs}][range % {len(BOROUGHS)} + 1] AS Borough,
+        'Zone ' || lpad((range + 1)::VARCHAR, 3, '0') AS Zone,
+        CASE WHEN range % {len(BOROUGHS)} = 0 THEN 'Yellow Zone' ELSE 'Boro Zone' END AS service_zone
+    FROM range(265);
+    """)
+
+
+def generate(path: str, rows: int) -> dict[str, float]:
+    """Write every dashboard table into the DuckDB file at `path`; returns per-table seconds."""
+    timings = {}
+    conn = duckdb.connect(path)
+    try:
+        _macros(conn)
+        steps = [
+            ("yellow_taxi_2019_1", lambda: yellow_taxi(conn, "yellow_taxi_2019_1", 2019, rows)),
+            ("yellow_taxi_2023", lambda: yellow_taxi(conn, "yellow_taxi_2023", 2023, rows)),
+        ]
+        for year in YEARS:
+            steps.append((f"chicago_taxi_{year}", lambda y=year: chicago_taxi(conn, f"chicago_taxi_{y}", y, rows)))
+            steps.append((f"chicago_traffic_{year}", lambda y=year: chicago_traffic(conn, f"chicago_traffic_{y}", y, rows)))
+        steps += [("cta_l_ridership", lambda: cta_ridership(conn)), ("NYC_zone_lookup", lambda: zone_lookup(conn))]
+        for table, step in steps:
+            start = time.perf_counter()
+            step()
+            timings[table] = time.perf_counter() - start
+        conn.execute("CHECKPOINT;")
+    finally:
+        conn.close()
+    return timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic CommutePulse DuckDB")
+    parser.add_argument("--scale", default="1M", help="rows per trip/traffic table: 1M, 10M, 100M or a number")
+    parser.add_argument("--out", default=None, help="output .duckdb path (default bench_<scale>.duckdb)")
+    args = parser.parse_args(argv)
+    out = args.out or f"bench_{args.scale}.duckdb"
+    for table, seconds in generate(out, parse_scale(args.scale)).items():
+        print(f"{table:<22} {seconds:6.1f}s")
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+# -----------------------------
+# Background cache warm-up
+# -----------------------------
+# A daemon thread that keeps the shared result cache warm. It runs the
+# dashboard's query set as soon as the process starts serving, again whenever
+# the source's version stamp changes, and on a fixed interval so entries are
+# recomputed before they expire. Pages key their results by the last version
+# the warmer finished (`published`), so a source change reaches readers only
+# once its results are ready.
+
+
+class Warmer:
+    def __init__(self, warm: Callable[[str, bool], None], version: Callable[[], str],
+                 interval: float, poll: float):
+        """warm(version, refresh) runs the query set; refresh=True recomputes cached results."""
+        self.warm = warm
+        self.version = version
+        self.interval = interval
+        self.poll = poll
+        self.published: str | None = None
+        self.runs = 0
+        self.last_run_at: str | None = None
+        self.last_ms: float | None = None
+        self.last_error: str | None = None
+        self._last_run = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="commutepulse-warmer", daemon=True)
+        self._start_lock = threading.Lock()
+
+    def start(self) -> "Warmer":
+        with self._start_lock:
+            if not self._thread.is_alive() and not self._stop.is_set():
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self) -> None:
+        version = self.version()
+        changed = version != self.published
+        due = self.interval > 0 and time.monotonic() - self._last_run >= self.interval
+        if not (changed or due):
+            return
+        started = time.perf_counter()
+        try:
+            self.warm(version, not changed)
+        except Exception as exc:
+            # Readers stay on the last good version; the next poll retries.
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            self.last_ms = (time.perf_counter() - started) * 1000
+        self.published = version
+        self.runs += 1
+        self.last_error = None
+        self._last_run = time.monotonic()
+        self.last_run_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_ms": self.last_ms,
+            "last_error": self.last_error,
+            "interval_s": self.interval,
+        }
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                pass  # recorded in last_error
+            self._stop.wait(self.poll)